@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class BlogConfig(AppConfig):
     name = 'blog'
+
+    def ready(self):
+        from . import search  # noqa: connects the search index signals
+        from newp import sqlite  # noqa: applies SQLITE_PRAGMAS to new connections
@@ -0,0 +1,102 @@
+"""
+Minimal MP3 inspection: magic-byte sniffing, ID3v2 text frames and the
+bitrate of the first MPEG audio frame.
+"""
+import os
+import struct
+
+
+# Kbit/s by bitrate index for MPEG-1 and MPEG-2/2.5 Layer III.
+BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+TEXT_ENCODINGS = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+
+# Bytes needed from the start of a file to recognise it.
+SNIFF_SIZE = 4
+
+
+def _is_frame_sync(header):
+    return len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0
+
+
+def sniff(head):
+    """Return True if ``head`` (the first bytes of a file) looks like MP3 audio."""
+    return head[:3] == b'ID3' or _is_frame_sync(head)
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _text(frame):
+    if not frame:
+        return None
+    text = frame[1:].decode(TEXT_ENCODINGS.get(frame[0], 'latin-1'), 'replace')
+    return text.strip('\x00').strip() or None
+
+
+def _read_id3(handle):
+    """Return ``(tag size, {frame id: text})`` for an ID3v2.3/2.4 tag."""
+    header = handle.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0, {}
+
+    version = header[3]
+    size = _syncsafe(header[6:10])
+    tag = handle.read(size)
+    frames = {}
+    position = 0
+
+    while version in (3, 4) and position + 10 <= len(tag):
+        frame_id = tag[position:position + 4]
+        if not frame_id.strip(b'\x00'):
+            break
+        if version == 4:
+            frame_size = _syncsafe(tag[position + 4:position + 8])
+        else:
+            frame_size = struct.unpack('>I', tag[position + 4:position + 8])[0]
+        body = tag[position + 10:position + 10 + frame_size]
+        if frame_id in (b'TIT2', b'TPE1'):
+            frames[frame_id.decode('ascii')] = _text(body)
+        position += 10 + frame_size
+
+    return 10 + size, frames
+
+
+def _first_frame_bitrate(handle, limit=65536):
+    data = handle.read(limit)
+
+    for position in range(len(data) - 3):
+        if not _is_frame_sync(data[position:position + 2]):
+            continue
+        version_bits = (data[position + 1] >> 3) & 0x03
+        layer_bits = (data[position + 1] >> 1) & 0x03
+        index = data[position + 2] >> 4
+        if layer_bits != 0x01 or version_bits == 0x01 or index in (0, 15):
+            continue
+        return BITRATES[1 if version_bits == 0x03 else 2][index]
+
+    return None
+
+
+def read_metadata(path):
+    """Return ``singer``, ``song_name``, ``bitrate`` (kbit/s) and an estimated
+    ``duration`` (seconds, assuming constant bitrate) for the file at ``path``."""
+    with open(path, 'rb') as handle:
+        tag_size, frames = _read_id3(handle)
+        handle.seek(tag_size)
+        bitrate = _first_frame_bitrate(handle)
+
+    duration = None
+    if bitrate:
+        duration = round((os.path.getsize(path) - tag_size) * 8 / (bitrate * 1000.0), 1)
+
+    return {
+        'singer': frames.get('TPE1'),
+        'song_name': frames.get('TIT2'),
+        'bitrate': bitrate,
+        'duration': duration,
+    }
@@ -0,0 +1,135 @@
+"""
+Profile photo thumbnails.
+
+An uploaded photo is stored once under the SHA-256 of its bytes; a
+background task then renders every size in ``SIZES`` in each of
+``FORMATS`` next to it. Since names change whenever the content does, the
+files are served with far-future immutable cache headers. When a user
+replaces their photo, files of the old version that no other user still
+points at are deleted, unless it was uploaded within ``ORPHAN_AGE``.
+"""
+import hashlib
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps, features
+
+from . import tasks
+from .models import DEFAULT_PROFILE_PHOTO, User
+
+AVATAR_DIR = 'static/blog/profile/avatars'
+
+SIZES = (32, 64, 256)
+
+# Files younger than this may belong to an upload whose thumbnails are still being rendered.
+ORPHAN_AGE = 3600
+
+# (extension, Pillow format, save options); WebP is skipped if Pillow was built without it.
+FORMATS = [('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True})]
+if features.check('webp'):
+    FORMATS.append(('webp', 'WEBP', {'quality': 80, 'method': 6}))
+
+
+def original_name(digest):
+    return '{0}/{1}'.format(AVATAR_DIR, digest)
+
+
+def variant_name(digest, size, extension='jpg'):
+    return '{0}/{1}-{2}.{3}'.format(AVATAR_DIR, digest, size, extension)
+
+
+def _names(digest):
+    names = [original_name(digest)]
+    for size in SIZES:
+        names.extend(variant_name(digest, size, extension) for extension, _, _ in FORMATS)
+    return names
+
+
+def store(user, uploaded):
+    """Save an uploaded photo under its content hash and schedule the thumbnails."""
+    sha = hashlib.sha256()
+    for chunk in uploaded.chunks():
+        sha.update(chunk)
+    digest = sha.hexdigest()
+
+    if not default_storage.exists(original_name(digest)):
+        uploaded.seek(0)
+        default_storage.save(original_name(digest), uploaded)
+    else:
+        # Uploaded again: keep collect and collect_orphans off it until this upload is processed.
+        os.utime(default_storage.path(original_name(digest)), None)
+
+    tasks.submit(process, user.id, digest)
+
+    return digest
+
+
+def process(user_id, digest):
+    """Render the thumbnails of ``digest``, switch the user to it and drop their old version."""
+    image = Image.open(default_storage.path(original_name(digest)))
+    image = ImageOps.exif_transpose(image) if hasattr(ImageOps, 'exif_transpose') else image
+    if image.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image.convert('RGBA'), mask=image.convert('RGBA').split()[-1])
+        image = background
+    image = image.convert('RGB')
+
+    for size in SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for extension, image_format, options in FORMATS:
+            path = default_storage.path(variant_name(digest, size, extension))
+            if not os.path.exists(path):
+                thumbnail.save(path, image_format, **options)
+
+    previous = User.objects.filter(pk=user_id).values_list('avatar_hash', flat=True).first()
+    User.objects.filter(pk=user_id).update(avatar_hash=digest, profile_photo=variant_name(digest, SIZES[-1]))
+
+    if previous and previous != digest:
+        collect(previous)
+
+
+def collect(digest):
+    """Delete the files of ``digest`` unless a user still uses it or it was recently uploaded."""
+    if User.objects.filter(avatar_hash=digest).exists():
+        return
+
+    original = default_storage.path(original_name(digest))
+    if os.path.exists(original) and os.path.getmtime(original) >= time.time() - ORPHAN_AGE:
+        # Its process task may not have switched the uploader to it yet; collect_orphans gets it later.
+        return
+
+    for name in _names(digest):
+        if default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def collect_orphans():
+    """Delete avatar files no user points at; returns the number of files removed."""
+    if not default_storage.exists(AVATAR_DIR):
+        return 0
+
+    used = set(User.objects.exclude(avatar_hash=None).values_list('avatar_hash', flat=True))
+    cutoff = time.time() - ORPHAN_AGE
+    removed = 0
+
+    for name in default_storage.listdir(AVATAR_DIR)[1]:
+        path = default_storage.path('{0}/{1}'.format(AVATAR_DIR, name))
+        if name.split('-')[0] not in used and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+
+    return removed
+
+
+def url(user, size, extension='jpg'):
+    """Return the URL of the smallest rendered size of ``user``'s photo that is at least ``size`` px."""
+    if not user.avatar_hash:
+        if not user.profile_photo or user.profile_photo.name == DEFAULT_PROFILE_PHOTO:
+            return '/{0}'.format(DEFAULT_PROFILE_PHOTO)
+        return reverse('blog:photo', kwargs={'u_id': user.id})
+
+    size = next((candidate for candidate in SIZES if candidate >= size), SIZES[-1])
+
+    return reverse('blog:avatar', kwargs={'name': '{0}-{1}.{2}'.format(user.avatar_hash, size, extension)})
@@ -0,0 +1,55 @@
+"""
+Runs a view's independent queries at the same time.
+
+``gather`` calls each function on a thread from a small pool, each with its
+own database connection, so the latency of the sidebar, the counters and the
+main content of a page overlaps instead of adding up. Functions must only
+read, and must not depend on each other's results. Their queries count
+towards the calling request in ``newp.instrumentation``.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections
+
+from newp import instrumentation, routers
+
+
+executor = ThreadPoolExecutor(max_workers=settings.QUERY_THREADS) if settings.QUERY_THREADS else None
+
+
+def _call(func, replicas, recorder):
+    routers.read_replicas(replicas)
+    # No request resets a pool thread's query logs; once full, new queries wouldn't show as added to them.
+    for alias in connections:
+        connections[alias].queries_log.clear()
+    try:
+        if recorder is None:
+            return func()
+        with recorder.record():
+            return func()
+    finally:
+        routers.read_replicas(False)
+        connection.close_if_unusable_or_obsolete()
+
+
+def gather(funcs):
+    """Call every function in ``funcs`` (a dict) and return ``{key: result}``.
+
+    They run one after another when ``settings.QUERY_THREADS`` is 0, or inside
+    a transaction, whose uncommitted rows other connections can't see.
+    """
+    if executor is None or len(funcs) < 2 or connections['default'].in_atomic_block:
+        return dict((key, func()) for key, func in funcs.items())
+
+    replicas = routers.reading_replicas()
+    recorder = instrumentation.current_recorder()
+    keys = list(funcs)
+    futures = [executor.submit(_call, funcs[key], replicas, recorder) for key in keys[1:]]
+    # The request's own thread takes one share of the work rather than just waiting.
+    results = {keys[0]: funcs[keys[0]]()}
+
+    for key, future in zip(keys[1:], futures):
+        results[key] = future.result()
+
+    return results
@@ -0,0 +1,334 @@
+import atexit
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from . import trending
+from .models import Blog, CounterShard, User
+
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of rows updated by one UPDATE ... CASE statement.
+BATCH_SIZE = 200
+
+
+def add_by_pk(model, field, values):
+    """Add ``values`` (``{pk: amount}``) to ``field``, one ``UPDATE ... CASE`` per batch."""
+    items = list(values.items())
+
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        delta = Case(*[When(pk=pk, then=Value(amount)) for pk, amount in batch],
+                     default=Value(0), output_field=IntegerField())
+        model.objects.filter(pk__in=[pk for pk, amount in batch]).update(**{field: F(field) + delta})
+
+
+class CounterBuffer(object):
+    """Accumulates increments of one ``Blog`` counter column in process.
+
+    Increments are written back in bulk once ``VIEW_COUNT_FLUSH_SIZE`` blogs
+    have pending counts or ``VIEW_COUNT_FLUSH_INTERVAL`` seconds have passed
+    since the last flush, whichever comes first; a background thread makes
+    the timed flush happen in an idle process too. With ``event`` set they
+    are also recorded as that trending event. A flush that fails is logged
+    and its increments are kept for the next one.
+    """
+
+    def __init__(self, field, event=None):
+        self.field = field
+        self.event = event
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self._thread = None
+
+    def _add(self, blog_id, amount):
+        with self._lock:
+            self._pending[blog_id] = self._pending.get(blog_id, 0) + amount
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='{0}-flusher'.format(self.field))
+                self._thread.daemon = True
+                self._thread.start()
+            return len(self._pending)
+
+    def incr(self, blog_id, amount=1):
+        size = self._add(blog_id, amount)
+
+        if size >= settings.VIEW_COUNT_FLUSH_SIZE or self._due():
+            self.flush()
+
+    def pending(self, blog_id):
+        return self._pending.get(blog_id, 0)
+
+    def _due(self):
+        return time.time() - self._last_flush >= settings.VIEW_COUNT_FLUSH_INTERVAL
+
+    def _run(self):
+        while True:
+            time.sleep(settings.VIEW_COUNT_FLUSH_INTERVAL)
+            if self._pending and self._due():
+                try:
+                    self.flush()
+                finally:
+                    connection.close_if_unusable_or_obsolete()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+
+        if not pending:
+            return
+
+        try:
+            with transaction.atomic():
+                if settings.COUNTER_QUEUE_INTERVAL is not None:
+                    for pk, amount in pending.items():
+                        counter_queue.add(Blog, pk, **{self.field: amount})
+                else:
+                    add_by_pk(Blog, self.field, pending)
+
+                if self.event is not None:
+                    trending.record(self.event, pending)
+        except DatabaseError:
+            # A locked database shouldn't fail the request that happened to flush.
+            logger.exception('Could not write buffered %s counts', self.field)
+            for pk, amount in pending.items():
+                self._add(pk, amount)
+
+
+class CounterQueue(object):
+    """Funnels small counter updates (``F() + n`` on ``Blog`` and ``User``
+    columns) through one writer.
+
+    With ``settings.COUNTER_QUEUE_INTERVAL`` set, ``add`` only records the
+    delta; a single background thread writes everything queued since its last
+    pass in one transaction every that many seconds, so concurrent requests
+    don't each take SQLite's write lock for one-row updates. With it unset
+    (the default, and in tests) ``add`` writes through immediately, as it
+    does inside ``writing_through`` (background tasks, whose transaction
+    must not commit without their deltas). Whatever is still queued is
+    written when the process exits.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._local = threading.local()
+
+    @contextmanager
+    def writing_through(self):
+        """Write the deltas added by the current thread inside the block immediately."""
+        previous = getattr(self._local, 'through', False)
+        self._local.through = True
+        try:
+            yield
+        finally:
+            self._local.through = previous
+
+    def add(self, model, pk, **deltas):
+        self.add_many(model, [pk], **deltas)
+
+    def add_many(self, model, pks, **deltas):
+        """Move each of ``deltas`` (field name to amount) on every row in ``pks``."""
+        deltas = dict((field, amount) for field, amount in deltas.items() if amount)
+        if not deltas or not pks:
+            return
+
+        if settings.COUNTER_QUEUE_INTERVAL is None or getattr(self._local, 'through', False):
+            model.objects.filter(pk__in=pks).update(**dict((field, F(field) + amount)
+                                                           for field, amount in deltas.items()))
+            return
+
+        # Deltas from a transaction that rolls back must never reach the queue.
+        transaction.on_commit(lambda: self._queue(model, pks, deltas))
+
+    def _queue(self, model, pks, deltas):
+        with self._lock:
+            for pk in pks:
+                self._merge(model, pk, deltas)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='counter-writer')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _merge(self, model, pk, deltas):
+        for field, amount in deltas.items():
+            column = self._pending.setdefault((model, field), {})
+            column[pk] = column.get(pk, 0) + amount
+
+    def _run(self):
+        while True:
+            time.sleep(settings.COUNTER_QUEUE_INTERVAL or 1)
+            try:
+                self.flush()
+            except DatabaseError:
+                logger.exception('Could not write queued counters')
+            finally:
+                connection.close_if_unusable_or_obsolete()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        try:
+            with transaction.atomic():
+                for (model, field), values in pending.items():
+                    add_by_pk(model, field, values)
+        except Exception:
+            # The transaction rolled back as a whole; queue everything again.
+            with self._lock:
+                for (model, field), values in pending.items():
+                    for pk, amount in values.items():
+                        self._merge(model, pk, {field: amount})
+            raise
+
+
+class ShardedCounters(object):
+    """Counters of hot ``Blog`` columns spread over ``settings.COUNTER_SHARDS``
+    rows per blog and column.
+
+    ``add`` increments a random shard, so concurrent likes or comments on one
+    blog rarely wait on the same row lock. The ``Blog`` column holds the total
+    as of the last ``compact``, which folds the shards back into it (keeping
+    sorting by ``popularity`` working); ``pending`` returns the not yet
+    compacted remainder, cached per blog until its next increment.
+
+    With ``settings.COUNTER_QUEUE_INTERVAL`` set, increments go through
+    ``counter_queue`` straight to the ``Blog`` columns instead: its single
+    writer leaves no concurrent row locks for shards to spread.
+    """
+
+    FIELDS = ('popularity', 'like_count', 'forward_count', 'comment_count')
+
+    def _key(self, blog_id):
+        return 'blog:shards:{0}'.format(blog_id)
+
+    def add(self, blog_ids, **deltas):
+        deltas = dict((field, amount) for field, amount in deltas.items() if amount)
+        if not deltas:
+            return
+
+        if settings.COUNTER_QUEUE_INTERVAL is not None:
+            counter_queue.add_many(Blog, blog_ids, **deltas)
+            return
+
+        for blog_id in blog_ids:
+            for field, amount in deltas.items():
+                shard = random.randrange(settings.COUNTER_SHARDS)
+                rows = CounterShard.objects.filter(blog_id=blog_id, field=field, shard=shard)
+                if rows.update(amount=F('amount') + amount):
+                    continue
+                try:
+                    with transaction.atomic():
+                        CounterShard.objects.create(blog_id=blog_id, field=field, shard=shard, amount=amount)
+                except IntegrityError:
+                    # Another request created this shard first.
+                    rows.update(amount=F('amount') + amount)
+
+        keys = [self._key(blog_id) for blog_id in blog_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    def pending(self, blog_ids):
+        """Return ``{blog id: {field: amount}}`` not yet folded into the ``Blog`` columns."""
+        keys = dict((self._key(blog_id), blog_id) for blog_id in blog_ids)
+        cached = cache.get_many(list(keys))
+        result = dict((keys[key], value) for key, value in cached.items())
+        missing = [blog_id for blog_id in blog_ids if blog_id not in result]
+
+        if missing:
+            for blog_id in missing:
+                result[blog_id] = {}
+            rows = CounterShard.objects.filter(blog_id__in=missing).values_list('blog_id', 'field') \
+                .annotate(total=Sum('amount')).order_by()
+            for blog_id, field, total in rows:
+                result[blog_id][field] = total
+            cache.set_many(dict((self._key(blog_id), result[blog_id]) for blog_id in missing),
+                           settings.COUNTER_SHARD_CACHE_TTL)
+
+        return result
+
+    def apply(self, blogs):
+        """Add the pending amounts to the counters of ``blogs`` as loaded."""
+        pending = self.pending([blog.id for blog in blogs])
+
+        for blog in blogs:
+            for field, amount in pending[blog.id].items():
+                setattr(blog, field, getattr(blog, field) + amount)
+
+        return blogs
+
+    def compact(self):
+        """Move every shard's amount into its ``Blog`` column; return the number of blogs updated."""
+        rows = list(CounterShard.objects.exclude(amount=0).values_list('id', 'blog_id', 'field', 'amount'))
+        totals = dict((field, {}) for field in self.FIELDS)
+
+        for pk, blog_id, field, amount in rows:
+            totals[field][blog_id] = totals[field].get(blog_id, 0) + amount
+
+        with transaction.atomic():
+            # Subtract what was read rather than zeroing, so increments made meanwhile stay.
+            add_by_pk(CounterShard, 'amount', dict((pk, -amount) for pk, blog_id, field, amount in rows))
+            for field, values in totals.items():
+                add_by_pk(Blog, field, values)
+
+        CounterShard.objects.filter(amount=0).delete()
+        blog_ids = set(row[1] for row in rows)
+        cache.delete_many([self._key(blog_id) for blog_id in blog_ids])
+
+        return len(blog_ids)
+
+
+def recount_users(expected):
+    """Rewrite the ``User`` counter columns that differ from ``expected``.
+
+    ``expected`` maps a column name to a ``{user_id: count}`` dict; users
+    missing from a dict should have a count of 0. Returns the number of
+    users repaired.
+    """
+    fields = list(expected)
+    drift = dict((field, {}) for field in fields)
+
+    for row in User.objects.values_list('id', *fields).iterator():
+        pk = row[0]
+        for field, stored in zip(fields, row[1:]):
+            count = expected[field].get(pk, 0)
+            if stored != count:
+                drift[field][pk] = count
+
+    for field, values in drift.items():
+        items = list(values.items())
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            value = Case(*[When(pk=pk, then=Value(count)) for pk, count in batch], output_field=IntegerField())
+            User.objects.filter(pk__in=[pk for pk, count in batch]).update(**{field: value})
+
+    return len(set().union(*drift.values()))
+
+
+view_counts = CounterBuffer('view_count', event='view')
+
+counter_queue = CounterQueue()
+
+blog_counters = ShardedCounters()
+
+
+@atexit.register
+def _flush_at_exit():
+    for counters in (view_counts, counter_queue):
+        try:
+            counters.flush()
+        except DatabaseError:
+            logger.exception('Could not flush buffered counters')
@@ -0,0 +1,43 @@
+"""
+Side effects of posting, forwarding and commenting.
+
+The views write the one row the user asked for and submit these as tasks
+(see ``blog.tasks``). Each takes ids and reloads what it needs, and does
+nothing if the blog was deleted before the worker got to it.
+"""
+from . import notifications, timeline, trending
+from .counters import blog_counters
+from .models import Blog
+
+
+def posted(blog_id):
+    blog = Blog.objects.filter(pk=blog_id).first()
+
+    if blog is not None:
+        timeline.fan_out(blog)
+
+
+def forwarded(blog_id):
+    blog = Blog.objects.select_related('fwd_blog').filter(pk=blog_id).first()
+
+    if blog is None or blog.fwd_blog is None:
+        return
+
+    original = blog.fwd_blog
+    timeline.fan_out(blog)
+    if not blog.fwd_viewed:
+        notifications.add(original.blog_author_id, 'forward_news')
+    trending.record('forward', {original.id: 1})
+    blog_counters.add([original.id], popularity=1, forward_count=1)
+
+
+def commented(blog_id):
+    # Runs even if the comment is already gone: deleting it undid these counts.
+    blog = Blog.objects.filter(pk=blog_id).first()
+
+    if blog is None:
+        return
+
+    notifications.add(blog.blog_author_id, 'comment_news')
+    trending.record('comment', {blog.id: 1})
+    blog_counters.add([blog.id], popularity=1, comment_count=1)
@@ -57,8 +57,9 @@ class MusicUploadForm(forms.Form):
 class BlogForm(forms.Form):
     title = forms.CharField(max_length=100, required=True)
     content = forms.CharField(widget=forms.Textarea, required=True)
-    private = forms.ChoiceField(choices=IS_PRIVATE, required=True)
+    private = forms.TypedChoiceField(choices=IS_PRIVATE, coerce=lambda value: value == 'True', required=True)
     music = forms.FileField(required=False)
+    music_id = forms.IntegerField(required=False, widget=forms.HiddenInput)
 
     def clean_file(self):
         try:
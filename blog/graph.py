@@ -0,0 +1,164 @@
+"""
+The follow graph.
+
+``follow``/``unfollow`` keep ``Relationship`` rows and their counters in
+step. Lookups go through the ``(from_user, to_user)`` unique index, so
+``is_following``, ``following_among`` and ``mutuals`` cost the same however
+many people a user follows; nothing here loads a whole follow list.
+
+``update_suggestions`` (run nightly by ``run_worker``) stores, for every
+user who follows someone, the people most followed by the ones they follow
+as ``FollowSuggestion`` rows; ``suggestions`` reads them back, leaving out
+anyone followed since.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import notifications, tasks, timeline
+from .counters import counter_queue, recount_users
+from .models import FollowSuggestion, Relationship, User
+
+
+# Mutual follows listed on a homepage.
+MUTUALS_SHOWN = 10
+
+
+def _version_key(user_id):
+    return 'blog:follow_version:{0}'.format(user_id)
+
+
+def follow_version(user_id):
+    """Return a stamp that changes whenever ``user_id`` follows or unfollows someone."""
+    version = cache.get(_version_key(user_id))
+
+    if version is None:
+        version = _bump(user_id)
+
+    return version
+
+
+def _bump(user_id):
+    # A fresh timestamp rather than a counter, so an evicted key can't reuse an old stamp.
+    version = int(time.time() * 1000000)
+    cache.set(_version_key(user_id), version, None)
+    return version
+
+
+def follow(from_user, to_user):
+    try:
+        with transaction.atomic():
+            Relationship.objects.create(from_user=from_user, to_user=to_user, add_date=timezone.now())
+            counter_queue.add(User, from_user.id, following_count=1)
+            counter_queue.add(User, to_user.id, follower_count=1)
+            notifications.add(to_user.id, 'follow_news')
+    except IntegrityError:
+        # A concurrent request already made this follow.
+        return
+
+    _bump(from_user.id)
+    tasks.submit(timeline.add_author, from_user.id, to_user.id)
+
+
+def unfollow(from_user, to_user):
+    with transaction.atomic():
+        relationships = Relationship.objects.filter(from_user=from_user, to_user=to_user)
+        unreviewed = relationships.filter(reviewed=False).count()
+        deleted, _ = relationships.delete()
+
+        if deleted:
+            counter_queue.add(User, from_user.id, following_count=-deleted)
+            counter_queue.add(User, to_user.id, follower_count=-deleted)
+            notifications.add(to_user.id, 'follow_news', -unreviewed)
+
+    _bump(from_user.id)
+    tasks.submit(timeline.remove_author, from_user.id, to_user.id)
+
+
+def _counts(column):
+    return dict(Relationship.objects.values_list(column).annotate(n=Count('id')).order_by())
+
+
+def recount():
+    """Recompute the follow counters of every user from ``Relationship``."""
+    return recount_users({
+        'following_count': _counts('from_user'),
+        'follower_count': _counts('to_user'),
+    })
+
+
+def is_following(from_user_id, to_user_id):
+    return Relationship.objects.filter(from_user_id=from_user_id, to_user_id=to_user_id).exists()
+
+
+def following_among(user_id, user_ids):
+    """Return the subset of ``user_ids`` that ``user_id`` follows."""
+    return set(Relationship.objects.filter(from_user_id=user_id, to_user_id__in=list(user_ids))
+               .values_list('to_user_id', flat=True))
+
+
+def mutuals(user_id):
+    """Users who follow ``user_id`` and are followed back, oldest account first."""
+    return User.objects.filter(from_user__to_user_id=user_id, to_user__from_user_id=user_id)
+
+
+def _suggestions_key(user_id):
+    return 'blog:follow_suggestions:{0}'.format(user_id)
+
+
+def suggestions(user_id, limit=None):
+    """Return the stored suggestions for ``user_id``, best first, each with a ``common_count``."""
+    version = follow_version(user_id)
+    cached = cache.get(_suggestions_key(user_id))
+
+    if cached is not None and cached[0] == version:
+        users = cached[1]
+    else:
+        rows = (FollowSuggestion.objects.filter(user_id=user_id)
+                .exclude(suggested__to_user__from_user_id=user_id)
+                .select_related('suggested').order_by('-score', 'suggested_id'))
+        users = []
+        for row in rows:
+            row.suggested.common_count = row.score
+            users.append(row.suggested)
+        cache.set(_suggestions_key(user_id), (version, users), settings.FOLLOW_SUGGESTION_INTERVAL)
+
+    return users[:limit]
+
+
+def _friends_of_friends(user_id):
+    # The most recently followed accounts stand in for the whole list of a user who follows thousands.
+    following = list(Relationship.objects.filter(from_user_id=user_id).order_by('-add_date')
+                     .values_list('to_user_id', flat=True)[:settings.FOLLOW_SUGGESTION_SOURCES])
+
+    return (Relationship.objects.filter(from_user_id__in=following)
+            .exclude(to_user_id=user_id).exclude(to_user__to_user__from_user_id=user_id)
+            .values_list('to_user_id').annotate(n=Count('id'))
+            .order_by('-n', 'to_user_id')[:settings.FOLLOW_SUGGESTIONS])
+
+
+def update_suggestions():
+    """Rebuild every user's ``FollowSuggestion`` rows; return how many users got suggestions."""
+    user_ids = set(Relationship.objects.values_list('from_user_id', flat=True).distinct())
+    count = 0
+
+    for user_id in user_ids:
+        found = list(_friends_of_friends(user_id))
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id=user_id).delete()
+            FollowSuggestion.objects.bulk_create(
+                FollowSuggestion(user_id=user_id, suggested_id=suggested_id, score=score)
+                for suggested_id, score in found)
+        cache.delete(_suggestions_key(user_id))
+        count += bool(found)
+
+    # Users who stopped following everyone keep nothing.
+    stale = FollowSuggestion.objects.exclude(user_id__in=Relationship.objects.values('from_user_id'))
+    cache.delete_many([_suggestions_key(user_id) for user_id in set(stale.values_list('user_id', flat=True))])
+    stale.delete()
+
+    return count
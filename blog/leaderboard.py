@@ -0,0 +1,21 @@
+from django.conf import settings
+
+from . import trending
+
+
+SIZE = 5
+
+
+def top():
+    """Return the blogs trending in ``settings.TRENDING_WINDOW``, with ``fwd_blog`` preloaded."""
+    return trending.top(settings.TRENDING_WINDOW, SIZE)
+
+
+def version(entries):
+    """Return a stamp that changes whenever the rendered leaderboard would."""
+    return ' '.join('{0}:{1}'.format(entry.id, entry.popularity) for entry in entries)
+
+
+def remove(blog):
+    """Drop the cached leaderboard if it shows ``blog`` or a forward of it."""
+    trending.forget(blog)
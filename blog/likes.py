@@ -0,0 +1,111 @@
+"""
+Likes.
+
+``like`` and ``unlike`` take any number of blogs and are idempotent: only
+the rows they actually insert or delete move ``like_count``, ``popularity``,
+the trending score and the authors' ``like_news``, in a ``count`` task. The unique
+``(to_blog, from_user)`` constraint makes a concurrent duplicate like fail
+instead of double counting; the request is then retried against the rows
+the other one committed.
+"""
+from django.db import IntegrityError, transaction
+
+from . import notifications, tasks, trending
+from .counters import blog_counters
+from .models import LikeRelationship
+
+
+# The Blog fields like(), unlike() and toggle() read.
+FIELDS = ('id', 'blog_author_id')
+
+# Most blogs one batch request may like or unlike.
+BATCH_SIZE = 100
+
+
+def _existing(user, blogs):
+    """Return ``{blog id: (like id, viewed)}`` for the blogs ``user`` likes, locking the rows."""
+    rows = LikeRelationship.objects.select_for_update().filter(from_user_id=user.id,
+                                                               to_blog_id__in=[blog.id for blog in blogs])
+
+    return dict((blog_id, (pk, viewed)) for pk, blog_id, viewed in rows.values_list('id', 'to_blog_id', 'viewed'))
+
+
+def count(blog_ids, delta, unviewed):
+    """Move the counters of ``blog_ids`` by ``delta``; ``unviewed`` pairs author ids with notification changes."""
+    trending.record('like', dict((blog_id, delta) for blog_id in blog_ids))
+    blog_counters.add(blog_ids, like_count=delta, popularity=delta)
+
+    for author_id, amount in unviewed:
+        notifications.add(author_id, 'like_news', amount)
+
+
+def _count(blogs, delta, unviewed):
+    tasks.submit(count, [blog.id for blog in blogs], delta, sorted(unviewed.items()))
+
+
+def _like(user, blogs, existing):
+    added = [blog for blog in blogs if blog.id not in existing and blog.blog_author_id != user.id]
+    authors = {}
+
+    if added:
+        LikeRelationship.objects.bulk_create([
+            LikeRelationship(to_blog_id=blog.id, from_user_id=user.id, to_author=blog.blog_author_id)
+            for blog in added
+        ])
+        for blog in added:
+            authors[blog.blog_author_id] = authors.get(blog.blog_author_id, 0) + 1
+        _count(added, 1, authors)
+
+    return added
+
+
+def _unlike(user, blogs, existing):
+    removed = [blog for blog in blogs if blog.id in existing]
+    authors = {}
+
+    if removed:
+        LikeRelationship.objects.filter(pk__in=[existing[blog.id][0] for blog in removed]).delete()
+        for blog in removed:
+            if not existing[blog.id][1]:
+                authors[blog.blog_author_id] = authors.get(blog.blog_author_id, 0) - 1
+        _count(removed, -1, authors)
+
+    return removed
+
+
+def _unique(blogs):
+    seen = set()
+    return [blog for blog in blogs if not (blog.id in seen or seen.add(blog.id))]
+
+
+def _apply(user, likes, unlikes, retry=True):
+    try:
+        with transaction.atomic():
+            existing = _existing(user, likes + unlikes)
+            return _like(user, likes, existing), _unlike(user, unlikes, existing)
+    except IntegrityError:
+        if not retry:
+            raise
+        return _apply(user, likes, unlikes, retry=False)
+
+
+def apply(user, likes=(), unlikes=()):
+    """Like ``likes`` and unlike ``unlikes`` (blogs with ``FIELDS`` loaded) in one transaction.
+
+    Returns the blogs whose state actually changed, as ``(liked, unliked)``.
+    """
+    return _apply(user, _unique(likes), _unique(unlikes))
+
+
+def toggle(user, blog):
+    """Like ``blog`` if ``user`` doesn't yet, otherwise unlike it; returns whether it is now liked."""
+    try:
+        with transaction.atomic():
+            existing = _existing(user, [blog])
+            if blog.id in existing:
+                _unlike(user, [blog], existing)
+                return False
+            return bool(_like(user, [blog], existing))
+    except IntegrityError:
+        # A concurrent request from the same user liked it first.
+        return True
@@ -0,0 +1,78 @@
+"""
+Request-scoped batch loading of users, blogs and music.
+
+A list page that follows a foreign key on every row (``news.from_user``,
+``blog.fwd_blog.blog_author``, ...) would otherwise run one query per row.
+``Loader.attach`` collects the ids a path references across all rows and
+fetches them with one ``IN`` query per model, setting the related objects
+on the rows so templates read them without querying. Objects already
+loaded earlier in the request are reused.
+
+Views call ``for_request(request).attach(rows, 'path', ...)`` before
+rendering.
+"""
+from .models import Blog, Music, User
+
+
+MODELS = {
+    'user': User,
+    'blog': Blog,
+    'music': Music,
+}
+
+
+class Loader(object):
+    def __init__(self):
+        self._loaded = dict((model, {}) for model in MODELS.values())
+
+    def load_many(self, model, ids):
+        """Return ``{id: instance}`` for ``ids``, querying only for those not loaded yet."""
+        loaded = self._loaded[model]
+        missing = set(pk for pk in ids if pk is not None and pk not in loaded)
+
+        if missing:
+            loaded.update(model.objects.in_bulk(list(missing)))
+
+        return dict((pk, loaded[pk]) for pk in ids if pk in loaded)
+
+    def load(self, model, pk):
+        return self.load_many(model, [pk]).get(pk)
+
+    def attach(self, objects, *paths):
+        """Set the objects each dotted foreign key path in ``paths`` leads to on every one of ``objects``."""
+        objects = list(objects)
+
+        for path in paths:
+            rows = objects
+            for name in path.split('.'):
+                rows = self._attach(rows, name)
+
+        return objects
+
+    def _attach(self, rows, name):
+        if not rows:
+            return []
+
+        field = rows[0]._meta.get_field(name)
+        if field.related_model not in self._loaded:
+            raise ValueError('{0} does not lead to a user, blog or music.'.format(name))
+
+        # Rows may already hold the object (select_related or an earlier attach).
+        cache_name = field.get_cache_name()
+        pending = [row for row in rows if not hasattr(row, cache_name)]
+        loaded = self.load_many(field.related_model, [getattr(row, field.attname) for row in pending])
+
+        for row in pending:
+            related = loaded.get(getattr(row, field.attname))
+            if related is not None:
+                setattr(row, name, related)
+
+        return [getattr(row, cache_name) for row in rows if getattr(row, cache_name, None) is not None]
+
+
+def for_request(request):
+    """Return the ``Loader`` of ``request``, creating it on first use."""
+    if not hasattr(request, 'loader'):
+        request.loader = Loader()
+
+    return request.loader
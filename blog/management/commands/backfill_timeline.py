@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from blog import timeline
+from blog.models import Relationship, Timeline
+
+
+class Command(BaseCommand):
+    help = 'Populate the materialized timelines from existing relationships and blogs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Delete all timeline entries first.')
+        parser.add_argument('--limit', type=int, default=timeline.BACKFILL_LIMIT,
+                            help='Newest blogs copied per followed author.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            Timeline.objects.all().delete()
+
+        relationships = Relationship.objects.values_list('from_user_id', 'to_user_id')
+        count = 0
+
+        for owner_id, author_id in relationships.iterator():
+            timeline.add_author(owner_id, author_id, limit=options['limit'])
+            count += 1
+
+        self.stdout.write('Backfilled {0} relationships.'.format(count))
@@ -0,0 +1,130 @@
+import json
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import resolve, reverse
+
+from blog import trending
+from blog.models import Blog, User
+from newp import instrumentation
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = ('Drive the main pages through the test client and report p50/p95/p99 latency and query counts, '
+            'optionally comparing against a saved baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--user', help='Username to log in as; defaults to the user following the most accounts.')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS.')
+        parser.add_argument('--baseline', help='Compare against this baseline JSON file.')
+        parser.add_argument('--save-baseline', help='Write the results to this JSON file.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative p95 slowdown before a scenario counts as a regression.')
+
+    def scenarios(self, options):
+        if options['user']:
+            user = User.objects.get(username=options['user'])
+        else:
+            user = User.objects.order_by('-following_count', 'id').first()
+        if user is None:
+            raise CommandError('No users; run generate_social_graph first.')
+
+        blog = Blog.objects.filter(blog_private=False).order_by('-comment_count', '-id').first()
+        celebrity = User.objects.order_by('-follower_count', 'id').first()
+        words = re.findall(r'\w+', blog.blog_content or blog.blog_title) if blog else []
+
+        scenarios = [
+            ('index', reverse('blog:index')),
+            ('homepage', reverse('blog:user', kwargs={'u_id': celebrity.id, 'slug': 'homepage'})),
+            ('news', reverse('blog:news')),
+        ]
+        if blog is not None:
+            scenarios.append(('blog', reverse('blog:blog', kwargs={'b_id': blog.id, 'slug': 'view'})))
+        if words:
+            scenarios.append(('search', reverse('blog:usercontrol', kwargs={'slug': 'search'}) +
+                              '?keyword=' + words[0]))
+
+        return user, scenarios
+
+    def run(self, client, url, count):
+        latencies = []
+
+        for _ in range(count):
+            start = time.time()
+            response = client.get(url)
+            latencies.append((time.time() - start) * 1000)
+
+            if response.status_code != 200:
+                raise CommandError('{0} returned {1}'.format(url, response.status_code))
+
+        return latencies
+
+    def queries(self, url):
+        """Return the most queries a request to ``url`` ran since the stats were reset.
+
+        Read from the middleware's stats, which also count the queries views
+        run on ``blog.concurrent`` pool threads.
+        """
+        view = instrumentation.stats.as_dict()[resolve(url.split('?')[0]).view_name]
+        return int(view['queries']['max'])
+
+    def handle(self, *args, **options):
+        user, scenarios = self.scenarios(options)
+        client = Client(HTTP_HOST=options['host'])
+        client.force_login(user)
+        results = {}
+
+        # run_worker keeps the trending rankings cached; measure pages as they are then.
+        trending.recompute()
+
+        self.stdout.write('Logged in as {0}'.format(user.username))
+        self.stdout.write('{0:<10} {1:>9} {2:>9} {3:>9} {4:>8}'.format('scenario', 'p50 ms', 'p95 ms', 'p99 ms',
+                                                                       'queries'))
+
+        for name, url in scenarios:
+            self.run(client, url, options['warmup'])
+            instrumentation.stats.reset()
+            latencies = self.run(client, url, options['requests'])
+            results[name] = {
+                'p50': round(percentile(latencies, 0.50), 2),
+                'p95': round(percentile(latencies, 0.95), 2),
+                'p99': round(percentile(latencies, 0.99), 2),
+                'queries': self.queries(url),
+            }
+            self.stdout.write('{0:<10} {p50:>9} {p95:>9} {p99:>9} {queries:>8}'.format(name, **results[name]))
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def compare(self, results, path, tolerance):
+        with open(path) as baseline:
+            baseline = json.load(baseline)
+
+        regressions = []
+
+        for name, result in sorted(results.items()):
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result['p95'] > before['p95'] * (1 + tolerance):
+                regressions.append('{0}: p95 {1} ms -> {2} ms'.format(name, before['p95'], result['p95']))
+            if result['queries'] > before['queries']:
+                regressions.append('{0}: {1} -> {2} queries'.format(name, before['queries'], result['queries']))
+
+        if regressions:
+            raise CommandError('Regressions against {0}:\n{1}'.format(path, '\n'.join(regressions)))
+
+        self.stdout.write('No regressions against {0}.'.format(path))
@@ -0,0 +1,90 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from blog import graph, timeline
+from blog.models import (Blog, Comment, FollowSuggestion, LikeRelationship, Relationship, Timeline, TrendingBucket,
+                         User)
+from blog.pagination import CursorPaginator
+
+
+# SQLite reports every full pass over a table as SCAN, including one walking an index in order
+# ("SCAN t USING INDEX i"); index lookups are reported as SEARCH.
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def hot_queries():
+    """Return ``(name, queryset)`` for the queries the views run on every request."""
+    user_id, other_id, blog_id = 1, 2, 1
+    cursor = CursorPaginator(Blog.objects.all(), 'blog_postdate').encode(Blog(id=1, blog_postdate=timezone.now()))
+
+    def page(queryset, date_field, id_field='id'):
+        return CursorPaginator(queryset, date_field, id_field).page(cursor).queryset[:21]
+
+    return [
+        ('trending buckets', TrendingBucket.objects.filter(hour__gte=timezone.now())
+            .values_list('blog_id', 'hour', 'score', 'blog__blog_private')),
+        ('trending scored', Blog.objects.filter(trending_score__gt=0).values_list('id', flat=True)),
+        ('timeline', timeline.read(user_id, cursor).queryset[:21]),
+        ('timeline author', Timeline.objects.filter(owner_id=user_id, blog_author_id=other_id)),
+        ('homepage', page(Blog.objects.filter(blog_author_id=user_id, blog_private=False), 'blog_postdate')),
+        ('timeline backfill', Blog.objects.filter(blog_author_id=other_id, blog_private=False)
+            .order_by('-blog_postdate', '-id')[:200]),
+        ('comments', page(Comment.objects.filter(comment_blog_id=blog_id), 'comment_date')),
+        ('following', page(Relationship.objects.filter(from_user_id=user_id), 'add_date')),
+        ('followers', page(Relationship.objects.filter(to_user_id=user_id), 'add_date')),
+        ('fan out', Relationship.objects.filter(to_user_id=user_id).values_list('from_user_id')),
+        ('is following', Relationship.objects.filter(from_user_id=user_id, to_user_id=other_id)),
+        ('mutuals', graph.mutuals(user_id)[:graph.MUTUALS_SHOWN]),
+        ('follow suggestions', FollowSuggestion.objects.filter(user_id=user_id)
+            .exclude(suggested__to_user__from_user_id=user_id).select_related('suggested')),
+        ('liked', LikeRelationship.objects.filter(to_blog_id=blog_id, from_user_id=user_id)),
+        ('user likes', LikeRelationship.objects.filter(from_user_id=user_id, to_blog_id__in=[1, 2, 3])),
+        ('like news', LikeRelationship.objects.filter(to_author=user_id, viewed=False)),
+        ('comment news', Comment.objects.filter(comment_blog__blog_author_id=user_id, viewed=False)),
+        ('forward news', Blog.objects.filter(fwd_blog__blog_author_id=user_id, fwd_viewed=False)),
+        ('follow news', Relationship.objects.filter(to_user_id=user_id, reviewed=False)),
+        ('user search', User.objects.filter(username_key__gte='a', username_key__lt='b').order_by('username_key')[:20]),
+    ]
+
+
+def explain(queryset):
+    """Return the plan lines and the tables read by a full scan."""
+    sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            lines = [row[-1] for row in cursor.fetchall()]
+            scans = [match.group(1) for match in map(SQLITE_SCAN.match, lines) if match]
+        elif connection.vendor == 'postgresql':
+            # On small tables a sequential scan is cheapest; rule it out to see whether an index applies.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            lines = [row[0] for row in cursor.fetchall()]
+            scans = [line.split(' on ')[1].split()[0] for line in lines if 'Seq Scan on' in line]
+        else:
+            raise CommandError('Query plans can only be checked on SQLite or PostgreSQL.')
+
+    return lines, scans
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on every hot query and fail if any of them scans a whole table.'
+
+    def handle(self, *args, **options):
+        failures = []
+
+        for name, queryset in hot_queries():
+            lines, scans = explain(queryset)
+            if options['verbosity'] > 1:
+                self.stdout.write('{0}:\n    {1}'.format(name, '\n    '.join(lines)))
+            if scans:
+                failures.append('{0}: full scan of {1}'.format(name, ', '.join(scans)))
+
+        if failures:
+            raise CommandError('Queries without a usable index:\n' + '\n'.join(failures))
+
+        self.stdout.write('All {0} hot queries use an index.'.format(len(hot_queries())))
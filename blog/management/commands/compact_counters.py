@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import blog_counters
+
+
+class Command(BaseCommand):
+    help = 'Fold the sharded like, comment, forward and popularity counters into their Blog columns.'
+
+    def handle(self, *args, **options):
+        count = blog_counters.compact()
+
+        self.stdout.write('Compacted the counters of {0} blogs.'.format(count))
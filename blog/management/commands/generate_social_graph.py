@@ -0,0 +1,208 @@
+import bisect
+import datetime
+import random
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from blog import graph, notifications, search, trending
+from blog.models import Blog, Comment, LikeRelationship, Relationship, TrendingBucket, User
+
+
+BATCH_SIZE = 500
+
+
+def _case(batch, value):
+    return Case(*[When(pk=pk, then=Value(value(values))) for pk, values in batch], output_field=IntegerField())
+
+
+class WeightedSampler(object):
+    def __init__(self, rng, weights):
+        self.rng = rng
+        self.cumulative = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            self.cumulative.append(total)
+        self.total = total
+
+    def pick(self):
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.total)
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic social graph for benchmarking: users with power-law follower counts, '
+            'posts, forwards, likes, comments, views and trending activity.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows', type=float, default=30, help='Mean accounts followed per user.')
+        parser.add_argument('--posts', type=float, default=10, help='Mean posts per user.')
+        parser.add_argument('--forward-ratio', type=float, default=0.15)
+        parser.add_argument('--private-ratio', type=float, default=0.1)
+        parser.add_argument('--likes', type=float, default=5, help='Scale of the power-law like count per post.')
+        parser.add_argument('--comments', type=float, default=3, help='Mean comments per post.')
+        parser.add_argument('--views', type=float, default=10, help='Mean views per post and like.')
+        parser.add_argument('--alpha', type=float, default=1.5, help='Pareto shape; lower is more skewed.')
+        parser.add_argument('--days', type=int, default=60, help='Spread post dates over this many days.')
+        parser.add_argument('--prefix', default='bench', help='Username prefix of generated users.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        prefix = options['prefix']
+
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError('Users named {0}* already exist.'.format(prefix))
+
+        with transaction.atomic():
+            user_ids = self.create_users()
+            weights = [self.rng.paretovariate(options['alpha']) for _ in user_ids]
+            self.create_follows(user_ids, WeightedSampler(self.rng, weights))
+            blogs = self.create_blogs(user_ids, WeightedSampler(self.rng, weights))
+            self.create_interactions(user_ids, blogs)
+            self.create_trending_buckets()
+
+            graph.recount()
+            notifications.recount()
+            search.rebuild()
+            call_command('backfill_timeline', stdout=self.stdout)
+
+        trending.recompute()
+        self.stdout.write('Generated {0} users and {1} blogs.'.format(len(user_ids), len(blogs)))
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        password = make_password(prefix)
+        names = ['{0}{1}'.format(prefix, i) for i in range(self.options['users'])]
+        # bulk_create skips User.save, which keeps username_key.
+        User.objects.bulk_create([
+            User(username=name, username_key=name.lower(), password=password, email='{0}@example.com'.format(name))
+            for name in names
+        ], batch_size=BATCH_SIZE)
+
+        return list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True))
+
+    def create_follows(self, user_ids, popular):
+        now = timezone.now()
+        relationships = []
+
+        for from_id in user_ids:
+            wanted = min(len(user_ids) - 1, int(self.rng.expovariate(1.0 / self.options['follows'])))
+            targets = set()
+            for _ in range(wanted * 3):
+                if len(targets) >= wanted:
+                    break
+                to_id = user_ids[popular.pick()]
+                if to_id != from_id:
+                    targets.add(to_id)
+            relationships.extend(Relationship(from_user_id=from_id, to_user_id=to_id, add_date=now,
+                                              reviewed=self.rng.random() < 0.8) for to_id in targets)
+
+        Relationship.objects.bulk_create(relationships, batch_size=BATCH_SIZE)
+
+    def create_blogs(self, user_ids, prolific):
+        """Create blogs in date order and return ``(id, author_id, private)`` tuples."""
+        now = timezone.now()
+        span = self.options['days'] * 24 * 3600
+        count = int(len(user_ids) * self.options['posts'])
+        dates = sorted(now - datetime.timedelta(seconds=self.rng.random() * span) for _ in range(count))
+        last_id = Blog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        blogs = []
+        forwards = {}
+
+        for index, date in enumerate(dates):
+            author_id = user_ids[prolific.pick()]
+            private = self.rng.random() < self.options['private_ratio']
+            if index and self.rng.random() < self.options['forward_ratio']:
+                forwards[index] = self.rng.randrange(index)
+            blogs.append(Blog(blog_title='Post {0} by user {1}'.format(index, author_id),
+                              blog_content=self.content(), blog_postdate=date, blog_author_id=author_id,
+                              blog_private=private, fwd_viewed=self.rng.random() < 0.8))
+
+        Blog.objects.bulk_create(blogs, batch_size=BATCH_SIZE)
+        rows = list(Blog.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'blog_author_id',
+                                                                                   'blog_private'))
+
+        links = [(rows[index][0], rows[target][0]) for index, target in forwards.items()]
+        for start in range(0, len(links), BATCH_SIZE):
+            batch = links[start:start + BATCH_SIZE]
+            Blog.objects.filter(pk__in=[pk for pk, target in batch]).update(
+                fwd_blog_id=_case(batch, lambda target: target))
+
+        self.forward_counts = {}
+        for pk, target in links:
+            self.forward_counts[target] = self.forward_counts.get(target, 0) + 1
+
+        return rows
+
+    def content(self):
+        words = ('music', 'jazz', 'rock', 'guitar', 'piano', 'song', 'album', 'concert', 'live', 'band',
+                 'vinyl', 'playlist', 'melody', 'lyrics', 'tour')
+        return ' '.join(self.rng.choice(words) for _ in range(self.rng.randint(5, 60)))
+
+    def create_interactions(self, user_ids, blogs):
+        likes = []
+        comments = []
+        counts = {}
+
+        for pk, author_id, private in blogs:
+            scale = self.options['likes']
+            like_count = min(len(user_ids) - 1, int((self.rng.paretovariate(self.options['alpha']) - 1) * scale))
+            likers = [user_id for user_id in self.rng.sample(user_ids, like_count + 1) if user_id != author_id]
+            likers = likers[:like_count]
+            likes.extend(LikeRelationship(to_blog_id=pk, to_author=author_id, from_user_id=user_id,
+                                          viewed=self.rng.random() < 0.8) for user_id in likers)
+
+            comment_count = int(self.rng.expovariate(1.0 / self.options['comments']))
+            comments.extend(Comment(comment_blog_id=pk, comment_author_id=self.rng.choice(user_ids),
+                                    comment_content=self.content(), viewed=self.rng.random() < 0.8)
+                            for _ in range(comment_count))
+
+            forward_count = self.forward_counts.get(pk, 0)
+            view_count = int(self.rng.expovariate(1.0 / self.options['views']) * (len(likers) + 1))
+            counts[pk] = (len(likers), comment_count, forward_count, view_count)
+
+            if len(likes) >= BATCH_SIZE * 10:
+                LikeRelationship.objects.bulk_create(likes, batch_size=BATCH_SIZE)
+                likes = []
+            if len(comments) >= BATCH_SIZE * 10:
+                Comment.objects.bulk_create(comments, batch_size=BATCH_SIZE)
+                comments = []
+
+        LikeRelationship.objects.bulk_create(likes, batch_size=BATCH_SIZE)
+        Comment.objects.bulk_create(comments, batch_size=BATCH_SIZE)
+
+        items = list(counts.items())
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            Blog.objects.filter(pk__in=[pk for pk, values in batch]).update(
+                like_count=_case(batch, lambda values: values[0]),
+                comment_count=_case(batch, lambda values: values[1]),
+                forward_count=_case(batch, lambda values: values[2]),
+                view_count=_case(batch, lambda values: values[3]),
+                popularity=_case(batch, lambda values: sum(values[:3])),
+            )
+
+    def create_trending_buckets(self):
+        """Count the interactions of posts inside the longest trending window in the hour they were posted."""
+        since = timezone.now() - datetime.timedelta(hours=max(settings.TRENDING_WINDOWS.values()))
+        rows = Blog.objects.filter(blog_author__username__startswith=self.options['prefix'],
+                                   blog_postdate__gte=since) \
+            .values_list('id', 'blog_postdate', 'like_count', 'comment_count', 'forward_count', 'view_count')
+        buckets = []
+
+        for pk, date, likes, comments, forwards, views in rows.iterator():
+            score = sum(trending.WEIGHTS[event] * amount for event, amount in
+                        (('like', likes), ('comment', comments), ('forward', forwards), ('view', views)))
+            if score:
+                buckets.append(TrendingBucket(blog_id=pk, hour=date.replace(minute=0, second=0, microsecond=0),
+                                              score=score))
+
+        TrendingBucket.objects.bulk_create(buckets, batch_size=BATCH_SIZE)
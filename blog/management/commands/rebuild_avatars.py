@@ -0,0 +1,42 @@
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from blog import avatars
+from blog.models import DEFAULT_PROFILE_PHOTO, User
+
+
+class Command(BaseCommand):
+    help = ('Render thumbnails for profile photos uploaded before the avatar pipeline existed, '
+            'then delete avatar files no user points at.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true',
+                            help='Delete the legacy time-named uploads once their thumbnails exist.')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(avatar_hash=None).exclude(profile_photo=DEFAULT_PROFILE_PHOTO) \
+            .exclude(profile_photo='').only('id', 'profile_photo')
+        converted = 0
+
+        for user in users.iterator():
+            legacy = user.profile_photo.name
+            if not default_storage.exists(legacy):
+                continue
+
+            with default_storage.open(legacy) as photo:
+                digest = hashlib.sha256(photo.read()).hexdigest()
+                if not default_storage.exists(avatars.original_name(digest)):
+                    photo.seek(0)
+                    default_storage.save(avatars.original_name(digest), photo)
+
+            avatars.process(user.id, digest)
+            converted += 1
+            if options['delete_originals']:
+                default_storage.delete(legacy)
+
+        removed = avatars.collect_orphans()
+
+        self.stdout.write('Rendered thumbnails for {0} users.'.format(converted))
+        self.stdout.write('Deleted {0} unused avatar files.'.format(removed))
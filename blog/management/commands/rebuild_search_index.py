@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blog import search
+
+
+class Command(BaseCommand):
+    help = 'Re-index every blog in the full-text search index.'
+
+    def handle(self, *args, **options):
+        count = search.rebuild()
+
+        self.stdout.write('Indexed {0} blogs.'.format(count))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog import graph, notifications
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized counters on User from the relationship tables.'
+
+    def handle(self, *args, **options):
+        following = graph.recount()
+        unread = notifications.recount()
+
+        self.stdout.write('Repaired follow counters of {0} users.'.format(following))
+        self.stdout.write('Repaired unread counters of {0} users.'.format(unread))
@@ -0,0 +1,71 @@
+import logging
+import signal
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog import graph, tasks, trending, uploads
+from blog.counters import blog_counters, counter_queue, view_counts
+
+
+logger = logging.getLogger(__name__)
+
+
+def periodic_jobs():
+    """Return ``(interval in seconds, function)`` for the jobs a worker runs when idle."""
+    return [
+        (settings.COUNTER_COMPACT_INTERVAL, blog_counters.compact),
+        (settings.TRENDING_INTERVAL, trending.recompute),
+        (settings.FOLLOW_SUGGESTION_INTERVAL, graph.update_suggestions),
+        (settings.MUSIC_UPLOAD_EXPIRY, uploads.prune),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Run queued background tasks until interrupted, and the periodic jobs (counter compaction, '
+            'trending scores, follow suggestions, abandoned uploads) when due. Start as many workers as needed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due.')
+        parser.add_argument('--batch', type=int, default=100, help='Tasks claimed per pass.')
+
+    def handle(self, *args, **options):
+        # Exit through SystemExit on SIGTERM too, so buffered counters are written before the worker stops.
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            total = self.work(options)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            for counters in (view_counts, counter_queue):
+                counters.flush()
+
+        self.stdout.write('Ran {0} tasks.'.format(total))
+
+    def work(self, options):
+        total = 0
+        last_run = {}
+
+        while True:
+            count = tasks.run_pending(options['batch'])
+            total += count
+
+            # Due jobs run between batches too, so a queue that never empties doesn't hold them off.
+            for interval, job in periodic_jobs():
+                if time.time() - last_run.get(job, 0) >= interval:
+                    try:
+                        job()
+                    except Exception:
+                        # Like a failing task, a failing job mustn't stop the worker; it runs again next interval.
+                        logger.exception('Periodic job %s failed', job.__name__)
+                    last_run[job] = time.time()
+            if count:
+                continue
+
+            tasks.prune()
+            if options['once']:
+                break
+            time.sleep(settings.TASK_POLL_INTERVAL)
+
+        return total
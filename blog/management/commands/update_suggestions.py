@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blog import graph
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every user\'s follow suggestions from the accounts their follows follow.'
+
+    def handle(self, *args, **options):
+        count = graph.update_suggestions()
+
+        self.stdout.write('Stored follow suggestions for {0} users.'.format(count))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blog import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute trending scores and rankings from the recent hourly buckets.'
+
+    def handle(self, *args, **options):
+        count = trending.recompute()
+
+        self.stdout.write('Scored {0} trending blogs.'.format(count))
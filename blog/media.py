@@ -0,0 +1,146 @@
+"""
+Serving of uploaded files (music and profile photos).
+
+``serve`` answers conditional requests with 304, single byte ranges with
+206, and otherwise streams the file with ``FileResponse`` so WSGI servers
+that provide ``wsgi.file_wrapper`` can hand it to ``sendfile``. With
+``settings.MEDIA_ACCEL`` set to ``'x-accel-redirect'`` (nginx) or
+``'x-sendfile'`` (Apache, lighttpd) the view only checks access and the
+front proxy sends the bytes, ranges included.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .models import Blog
+
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+BLOCK_SIZE = 65536
+
+
+class RangeFile(object):
+    """Read at most ``length`` bytes of ``handle`` from its current position."""
+
+    def __init__(self, handle, length):
+        self.handle = handle
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.handle.close()
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        # If-None-Match compares weakly: W/"x" matches "x".
+        tags = [re.sub(r'^W/', '', tag.strip()) for tag in if_none_match.split(',')]
+        return etag in tags or if_none_match.strip() == '*'
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def _byte_range(request, etag, mtime, size):
+    """Return ``(start, end)`` of a satisfiable single range, None to send the whole file,
+    or False if the range cannot be satisfied."""
+    match = RANGE.match(request.META.get('HTTP_RANGE', '').strip())
+    if match is None:
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(mtime):
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+
+    if start > end or start >= size:
+        return False
+
+    return start, end
+
+
+def serve(request, name, etag=None, cache_control='public, max-age=86400'):
+    """Respond with the stored file ``name``, honouring conditional and Range headers."""
+    path = default_storage.path(name)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404
+
+    etag = quote_etag(etag or '{0:x}-{1:x}'.format(int(stat.st_mtime), stat.st_size))
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_ACCEL:
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_ACCEL == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + name
+        else:
+            response['X-Sendfile'] = path
+    else:
+        byte_range = _byte_range(request, etag, stat.st_mtime, stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{0}'.format(stat.st_size)
+        elif byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response['Content-Length'] = stat.st_size
+        else:
+            start, end = byte_range
+            handle = open(path, 'rb')
+            handle.seek(start)
+            response = FileResponse(RangeFile(handle, end - start + 1), content_type=content_type, status=206)
+            response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, end, stat.st_size)
+            response['Content-Length'] = end - start + 1
+        response.block_size = BLOCK_SIZE
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+
+    return response
+
+
+def music_access(user, music):
+    """Return ``'public'`` if a public blog plays ``music``, ``'private'`` if only blogs
+    ``user`` wrote do, or None if ``user`` may not hear it."""
+    blogs = Blog.objects.filter(relate_music=music)
+    if user.is_authenticated:
+        blogs = blogs.filter(blog_private=False) | blogs.filter(blog_author_id=user.id)
+    else:
+        blogs = blogs.filter(blog_private=False)
+
+    access = set(blogs.values_list('blog_private', flat=True).distinct())
+    if False in access:
+        return 'public'
+    if True in access:
+        return 'private'
+
+    return None
+
+
+def may_attach(user, music):
+    """Return True if ``user`` uploaded ``music`` or may already hear it."""
+    return music.uploaders.filter(pk=user.id).exists() or music_access(user, music) is not None
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 13:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_follows(apps, schema_editor):
+    User = apps.get_model('blog', 'User')
+    Relationship = apps.get_model('blog', 'Relationship')
+
+    for field, column in (('following_count', 'from_user'), ('follower_count', 'to_user')):
+        for user_id, count in Relationship.objects.values_list(column).annotate(n=Count('id')).order_by():
+            User.objects.filter(pk=user_id).update(**{field: count})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_follows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 13:08
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread_news(apps, schema_editor):
+    User = apps.get_model('blog', 'User')
+    Blog = apps.get_model('blog', 'Blog')
+    Comment = apps.get_model('blog', 'Comment')
+    LikeRelationship = apps.get_model('blog', 'LikeRelationship')
+    Relationship = apps.get_model('blog', 'Relationship')
+
+    unread = (
+        ('like_news', LikeRelationship.objects.filter(viewed=False), 'to_author'),
+        ('comment_news', Comment.objects.filter(viewed=False), 'comment_blog__blog_author'),
+        ('forward_news', Blog.objects.filter(fwd_blog__isnull=False, fwd_viewed=False), 'fwd_blog__blog_author'),
+        ('follow_news', Relationship.objects.filter(reviewed=False), 'to_user'),
+    )
+
+    for field, queryset, column in unread:
+        for user_id, count in queryset.values_list(column).annotate(n=Count('id')).order_by():
+            User.objects.filter(pk=user_id).update(**{field: count})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_user_follow_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='comment_news',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='follow_news',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='forward_news',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='like_news',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_unread_news, migrations.RunPython.noop),
+    ]
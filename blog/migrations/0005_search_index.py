@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE blog_search USING fts5(title, content, private UNINDEXED, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO blog_search (rowid, title, content, private) "
+            "SELECT id, blog_title, coalesce(blog_content, ''), blog_private FROM blog_blog"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX blog_blog_search ON blog_blog USING gin("
+            "to_tsvector('english', blog_title || ' ' || coalesce(blog_content, '')))"
+        )
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE blog_search")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX blog_blog_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_user_unread_news'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
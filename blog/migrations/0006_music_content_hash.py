@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 13:16
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='music',
+            name='bitrate',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='music',
+            name='content_hash',
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='music',
+            name='duration',
+            field=models.FloatField(null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 13:23
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    """Keep the oldest like of each (blog, user) pair and take the others off the counters."""
+    Blog = apps.get_model('blog', 'Blog')
+    LikeRelationship = apps.get_model('blog', 'LikeRelationship')
+    User = apps.get_model('blog', 'User')
+
+    duplicated = (LikeRelationship.objects.values('to_blog', 'from_user').annotate(n=Count('id'), first=Min('id'))
+                  .filter(n__gt=1).order_by())
+
+    for pair in duplicated:
+        extra = LikeRelationship.objects.filter(to_blog=pair['to_blog'], from_user=pair['from_user']) \
+            .exclude(pk=pair['first'])
+        unviewed = extra.filter(viewed=False).values_list('to_author', flat=True)
+        for author_id in list(unviewed):
+            User.objects.filter(pk=author_id).update(like_news=F('like_news') - 1)
+        removed = extra.count()
+        extra.delete()
+        Blog.objects.filter(pk=pair['to_blog']).update(like_count=F('like_count') - removed,
+                                                       popularity=F('popularity') - removed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_user_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='likerelationship',
+            unique_together=set([('to_blog', 'from_user')]),
+        ),
+    ]
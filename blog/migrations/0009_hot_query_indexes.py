@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 13:25
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, F, Min
+
+
+# Indexes for the unread-news lookups of DetailNewsView: (table, index name, key column, read flag).
+UNREAD_INDEXES = (
+    ('blog_likerelationship', 'blog_likerelationship_unread', 'to_author', 'viewed'),
+    ('blog_comment', 'blog_comment_unread', 'comment_blog_id', 'viewed'),
+    ('blog_blog', 'blog_blog_forward_unread', 'fwd_blog_id', 'fwd_viewed'),
+    ('blog_relationship', 'blog_relationship_unread', 'to_user_id', 'reviewed'),
+)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Keep the oldest of each (from_user, to_user) relationship and take the others off the counters."""
+    Relationship = apps.get_model('blog', 'Relationship')
+    User = apps.get_model('blog', 'User')
+
+    duplicated = (Relationship.objects.values('from_user', 'to_user').annotate(n=Count('id'), first=Min('id'))
+                  .filter(n__gt=1).order_by())
+
+    for pair in duplicated:
+        extra = Relationship.objects.filter(from_user=pair['from_user'], to_user=pair['to_user']) \
+            .exclude(pk=pair['first'])
+        removed = extra.count()
+        unreviewed = extra.filter(reviewed=False).count()
+        extra.delete()
+        User.objects.filter(pk=pair['from_user']).update(following_count=F('following_count') - removed)
+        User.objects.filter(pk=pair['to_user']).update(follower_count=F('follower_count') - removed,
+                                                       follow_news=F('follow_news') - unreviewed)
+
+
+def create_unread_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    for table, name, column, flag in UNREAD_INDEXES:
+        if vendor == 'postgresql':
+            # Only unread rows are ever looked up, and they are a small fraction of each table.
+            schema_editor.execute('CREATE INDEX {0} ON {1} ({2}) WHERE NOT {3}'.format(name, table, column, flag))
+        else:
+            # SQLite can't match a partial index against the bound parameter Django sends for the flag.
+            schema_editor.execute('CREATE INDEX {0} ON {1} ({2}, {3})'.format(name, table, column, flag))
+
+
+def drop_unread_indexes(apps, schema_editor):
+    # SQLite loses an index when a later migration rebuilds its table.
+    for table, name, column, flag in UNREAD_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS {0}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_likerelationship_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='relationship',
+            unique_together=set([('from_user', 'to_user')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='blog',
+            index_together=set([('blog_author', 'blog_postdate', 'id'), ('blog_private', 'popularity', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='comment',
+            index_together=set([('comment_blog', 'comment_date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='relationship',
+            index_together=set([('from_user', 'add_date'), ('to_user', 'add_date')]),
+        ),
+        migrations.RunPython(create_unread_indexes, drop_unread_indexes),
+    ]
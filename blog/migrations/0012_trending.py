@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 13:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_countershard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(db_index=True)),
+                ('score', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='trendingbucket',
+            name='blog',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blog.Blog'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='trendingbucket',
+            unique_together=set([('blog', 'hour')]),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 13:51
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_follow_suggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='music',
+            name='uploaders',
+            field=models.ManyToManyField(blank=True, related_name='uploaded_music', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 17:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_username_keys(apps, schema_editor):
+    User = apps.get_model('blog', 'User')
+
+    # Lowercased in Python rather than with SQL LOWER(), which SQLite applies to ASCII only.
+    for pk, username in User.objects.values_list('id', 'username').iterator():
+        User.objects.filter(pk=pk).update(username_key=username.lower())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_blog_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='username_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=150),
+        ),
+        migrations.RunPython(fill_username_keys, migrations.RunPython.noop),
+    ]
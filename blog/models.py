@@ -35,10 +35,30 @@ class User(AbstractUser):
         default=DEFAULT_PROFILE_PHOTO,
         blank=True
     )
+    avatar_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # Lowercased username, for indexed case-insensitive prefix search.
+    username_key = models.CharField(max_length=150, db_index=True, editable=False, default='')
+    following_count = models.IntegerField(default=0)
+    follower_count = models.IntegerField(default=0)
+    like_news = models.IntegerField(default=0)
+    comment_news = models.IntegerField(default=0)
+    forward_news = models.IntegerField(default=0)
+    follow_news = models.IntegerField(default=0)
 
     class Meta:
         ordering = ['date_joined']
 
+    @property
+    def unread_news(self):
+        return self.like_news + self.comment_news + self.forward_news + self.follow_news
+
+    def save(self, *args, **kwargs):
+        self.username_key = self.username.lower()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'username' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'username_key'}
+        super(User, self).save(*args, **kwargs)
+
 
 class Relationship(models.Model):
     from_user = models.ForeignKey(
@@ -54,6 +74,13 @@ class Relationship(models.Model):
     reviewed = models.BooleanField(default=False)
     add_date = models.DateTimeField('Date added.')
 
+    class Meta:
+        unique_together = ('from_user', 'to_user')
+        index_together = [
+            ('from_user', 'add_date'),
+            ('to_user', 'add_date'),
+        ]
+
 
 class Music(models.Model):
     singer = models.CharField(max_length=50, null=True)
@@ -62,6 +89,14 @@ class Music(models.Model):
         upload_to=music_directory_path,
         null=True
     )
+    content_hash = models.CharField(max_length=64, unique=True, null=True)
+    duration = models.FloatField(null=True)
+    bitrate = models.IntegerField(null=True)
+    uploaders = models.ManyToManyField(
+        settings.AUTH_USER_MODEL,
+        related_name='uploaded_music',
+        blank=True
+    )
 
 
 class Blog(models.Model):
@@ -96,9 +131,16 @@ class Blog(models.Model):
     forward_count = models.IntegerField(default=0)
     comment_count = models.IntegerField(default=0)
     view_count = models.IntegerField(default=0)
+    trending_score = models.FloatField(default=0, db_index=True)
+    # Changes on every save (not on counter updates); versions cached renderings of the post.
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-blog_postdate']
+        index_together = [
+            ('blog_private', 'popularity', 'id'),
+            ('blog_author', 'blog_postdate', 'id'),
+        ]
 
     # def __str__(self):
     #     return "Title: " + self.blog_title + "; Author: " + User.objects.get(pk=self.blog_author_id).__str__()
@@ -111,6 +153,9 @@ class LikeRelationship(models.Model):
     viewed = models.BooleanField(default=False)
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        unique_together = ('to_blog', 'from_user')
+
 
 class Comment(models.Model):
     """docstring for Comment"""
@@ -122,9 +167,92 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-comment_date']
+        index_together = [
+            ('comment_blog', 'comment_date'),
+        ]
 
     # def __str__(self):
     #     return "User: " + User.objects.get(
     #         pk=self.comment_author_id).user_name + "; " + "Comment on blog: " + Blog.objects.get(
     #         pk=self.comment_blog_id).blog_title + "."
 
+
+class Timeline(models.Model):
+    """One row per (follower, public blog) pair, written when the blog is posted."""
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE)
+    blog_author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    blog_postdate = models.DateTimeField("Date posted")
+
+    class Meta:
+        ordering = ['-blog_postdate', '-blog']
+        unique_together = ('owner', 'blog')
+        index_together = [
+            ('owner', 'blog_postdate', 'blog'),
+            ('owner', 'blog_author'),
+        ]
+
+
+class CounterShard(models.Model):
+    """Part of a ``Blog`` counter not yet folded into its column (see ``blog.counters.ShardedCounters``)."""
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE)
+    field = models.CharField(max_length=20)
+    shard = models.SmallIntegerField()
+    amount = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('blog', 'field', 'shard')
+
+
+class TrendingBucket(models.Model):
+    """Weighted like, forward, comment and view events of a blog in one hour (see ``blog.trending``)."""
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE)
+    hour = models.DateTimeField(db_index=True)
+    score = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('blog', 'hour')
+
+
+class Task(models.Model):
+    """A call queued by ``blog.tasks.submit`` for the worker."""
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS = (
+        (PENDING, u'Pending'),
+        (DONE, u'Done'),
+        (FAILED, u'Failed'),
+    )
+
+    name = models.CharField(max_length=200)
+    args = models.TextField()
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=7, default=PENDING, choices=STATUS)
+    run_at = models.DateTimeField()
+    locked_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        index_together = [
+            ('status', 'run_at'),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """A user followed by ``score`` of the people ``user`` follows (see ``blog.graph.update_suggestions``)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'suggested')
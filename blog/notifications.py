@@ -0,0 +1,52 @@
+from django.db.models import Count
+
+from .counters import counter_queue, recount_users
+from .models import Blog, Comment, LikeRelationship, Relationship, User
+
+
+def add(user_id, field, amount=1):
+    """Adjust one of the unread counters (``like_news``, ``comment_news``,
+    ``forward_news`` or ``follow_news``) of a user."""
+    counter_queue.add(User, user_id, **{field: amount})
+
+
+def _counts(queryset, column):
+    return dict(queryset.values_list(column).annotate(n=Count('id')).order_by())
+
+
+def unread_counts():
+    """Count the unread news of every user from the source tables."""
+    return {
+        'like_news': _counts(LikeRelationship.objects.filter(viewed=False), 'to_author'),
+        'comment_news': _counts(Comment.objects.filter(viewed=False), 'comment_blog__blog_author'),
+        'forward_news': _counts(Blog.objects.filter(fwd_blog__isnull=False, fwd_viewed=False),
+                                'fwd_blog__blog_author'),
+        'follow_news': _counts(Relationship.objects.filter(reviewed=False), 'to_user'),
+    }
+
+
+def recount():
+    """Recompute the unread counters of every user."""
+    return recount_users(unread_counts())
+
+
+def forget_blog(blog_id):
+    """Take back the unread news that goes away with blog ``blog_id`` and the forwards deleted
+    with it; call before deleting it, in the same transaction."""
+    blog_ids = [blog_id]
+    forwards = blog_ids
+    while forwards:
+        forwards = list(Blog.objects.filter(fwd_blog_id__in=forwards).values_list('id', flat=True))
+        blog_ids.extend(forwards)
+
+    gone = {
+        'like_news': _counts(LikeRelationship.objects.filter(to_blog_id__in=blog_ids, viewed=False), 'to_author'),
+        'comment_news': _counts(Comment.objects.filter(comment_blog_id__in=blog_ids, viewed=False),
+                                'comment_blog__blog_author'),
+        'forward_news': _counts(Blog.objects.filter(pk__in=blog_ids, fwd_blog__isnull=False, fwd_viewed=False),
+                                'fwd_blog__blog_author'),
+    }
+
+    for field, counts in gone.items():
+        for user_id, count in counts.items():
+            add(user_id, field, -count)
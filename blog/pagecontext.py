@@ -0,0 +1,51 @@
+"""
+Context every page shares: the logged-in user, their follow counts and the
+popular blogs sidebar.
+
+``for_request`` builds it once per request and each value is loaded on
+first use only. The user is the one ``AuthenticationMiddleware`` already
+fetched, and the sidebar is handed to templates as callables, so responses
+that never render it never read it.
+"""
+from django.conf import settings
+from django.utils.functional import cached_property
+
+from . import leaderboard
+
+
+class PageContext(object):
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def log_user(self):
+        return self.request.user if self.request.user.is_active else None
+
+    @cached_property
+    def popularity(self):
+        return leaderboard.top()
+
+    def popularity_version(self):
+        return leaderboard.version(self.popularity)
+
+    def as_dict(self):
+        context = {
+            'log_user': self.log_user,
+            'popularity': lambda: self.popularity,
+            'popularity_version': self.popularity_version,
+            'fragment_ttl': settings.FRAGMENT_CACHE_TTL,
+        }
+
+        if self.log_user is not None:
+            context['following_count'] = self.log_user.following_count
+            context['follower_count'] = self.log_user.follower_count
+
+        return context
+
+
+def for_request(request):
+    """Return the ``PageContext`` of ``request``, creating it on first use."""
+    if not hasattr(request, 'page_context'):
+        request.page_context = PageContext(request)
+
+    return request.page_context
@@ -0,0 +1,110 @@
+import datetime
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils import timezone
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+PAGE_SIZE = 20
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(object):
+    """One page of a ``CursorPaginator``; the query runs on first use."""
+
+    def __init__(self, paginator, queryset):
+        self.paginator = paginator
+        self.queryset = queryset
+        self._object_list = None
+        self._next_cursor = None
+
+    def _fetch(self):
+        if self._object_list is not None:
+            return
+
+        per_page = self.paginator.per_page
+        objects = list(self.queryset[:per_page + 1])
+
+        if len(objects) > per_page:
+            objects = objects[:per_page]
+            self._next_cursor = self.paginator.encode(objects[-1])
+
+        if self.paginator.transform is not None:
+            objects = [self.paginator.transform(obj) for obj in objects]
+
+        self._object_list = objects
+
+    @property
+    def object_list(self):
+        self._fetch()
+        return self._object_list
+
+    @property
+    def next_cursor(self):
+        self._fetch()
+        return self._next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator(object):
+    """Keyset pagination over ``(date_field, id_field)``, newest first.
+
+    Each page is fetched with ``WHERE (date, id) < cursor ORDER BY date DESC,
+    id DESC LIMIT n``, so deep pages cost the same as the first one.
+    """
+
+    def __init__(self, queryset, date_field, id_field='id', per_page=PAGE_SIZE, transform=None):
+        self.queryset = queryset
+        self.date_field = date_field
+        self.id_field = id_field
+        self.per_page = per_page
+        self.transform = transform
+
+    def encode(self, obj):
+        date = getattr(obj, self.date_field)
+        pk = getattr(obj, self.id_field)
+        return '{0}-{1}'.format((date - EPOCH) // datetime.timedelta(microseconds=1), pk)
+
+    def decode(self, cursor):
+        try:
+            microseconds, pk = cursor.split('-')
+            date = EPOCH + datetime.timedelta(microseconds=int(microseconds))
+            return date, int(pk)
+        except (ValueError, OverflowError):
+            raise InvalidCursor(cursor)
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by('-' + self.date_field, '-' + self.id_field)
+
+        if cursor:
+            date, pk = self.decode(cursor)
+            queryset = queryset.filter(
+                Q(**{self.date_field + '__lt': date}) |
+                Q(**{self.date_field: date, self.id_field + '__lt': pk})
+            )
+
+        return CursorPage(self, queryset)
+
+
+def paginate(request, queryset, date_field, id_field='id', per_page=PAGE_SIZE):
+    """Return the page selected by the ``cursor`` query parameter."""
+    paginator = CursorPaginator(queryset, date_field, id_field, per_page)
+
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404
@@ -0,0 +1,174 @@
+import re
+
+from django.db import connections, router
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import tasks
+from .models import Blog, User
+
+
+PAGE_SIZE = 20
+
+USER_LIMIT = 20
+
+SQLITE_TABLE = 'blog_search'
+
+# Saves that only touch other columns (counters) leave the index alone.
+INDEXED_FIELDS = frozenset(['blog_title', 'blog_content', 'blog_private'])
+
+POSTGRES_DOCUMENT = "to_tsvector('english', blog_title || ' ' || coalesce(blog_content, ''))"
+
+
+class SqliteBackend(object):
+    """FTS5 table keyed by blog id, ranked with bm25."""
+
+    def index(self, cursor, blog):
+        cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(SQLITE_TABLE), [blog.id])
+        cursor.execute(
+            'INSERT INTO {0} (rowid, title, content, private) VALUES (%s, %s, %s, %s)'.format(SQLITE_TABLE),
+            [blog.id, blog.blog_title, blog.blog_content or '', int(bool(blog.blog_private))]
+        )
+
+    def remove(self, cursor, blog_id):
+        cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(SQLITE_TABLE), [blog_id])
+
+    def search(self, cursor, keyword, offset, limit):
+        terms = re.findall(r'\w+', keyword, re.UNICODE)
+        if not terms:
+            return []
+
+        query = ' '.join('"{0}"*'.format(term) for term in terms)
+        cursor.execute(
+            'SELECT rowid FROM {0} WHERE {0} MATCH %s AND private = 0 ORDER BY rank LIMIT %s OFFSET %s'.format(
+                SQLITE_TABLE),
+            [query, limit, offset]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBackend(object):
+    """Expression GIN index on ``blog_blog``; Postgres keeps it current itself."""
+
+    def index(self, cursor, blog):
+        pass
+
+    def remove(self, cursor, blog_id):
+        pass
+
+    def search(self, cursor, keyword, offset, limit):
+        cursor.execute(
+            'SELECT id FROM blog_blog WHERE NOT blog_private AND {0} @@ plainto_tsquery(\'english\', %s) '
+            'ORDER BY ts_rank({0}, plainto_tsquery(\'english\', %s)) DESC, id DESC LIMIT %s OFFSET %s'.format(
+                POSTGRES_DOCUMENT),
+            [keyword, keyword, limit, offset]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackBackend(object):
+    """Unindexed substring match for other databases."""
+
+    def index(self, cursor, blog):
+        pass
+
+    def remove(self, cursor, blog_id):
+        pass
+
+    def search(self, cursor, keyword, offset, limit):
+        blogs = Blog.objects.filter(blog_title__icontains=keyword, blog_private=False).order_by('-id')
+        return list(blogs.values_list('id', flat=True)[offset:offset + limit])
+
+
+BACKENDS = {
+    'sqlite': SqliteBackend(),
+    'postgresql': PostgresBackend(),
+}
+
+
+def _backend(alias):
+    return BACKENDS.get(connections[alias].vendor, FallbackBackend())
+
+
+def reindex(blog_id):
+    """Bring the index entry of ``blog_id`` up to date, dropping it if the blog is gone."""
+    blog = Blog.objects.only('id', 'blog_title', 'blog_content', 'blog_private').filter(pk=blog_id).first()
+
+    if blog is None:
+        remove(blog_id)
+    else:
+        index(blog)
+
+
+def index(blog):
+    alias = router.db_for_write(Blog)
+    with connections[alias].cursor() as cursor:
+        _backend(alias).index(cursor, blog)
+
+
+def remove(blog_id):
+    alias = router.db_for_write(Blog)
+    with connections[alias].cursor() as cursor:
+        _backend(alias).remove(cursor, blog_id)
+
+
+class SearchPage(object):
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def search_blogs(keyword, page=1, per_page=PAGE_SIZE):
+    """Return one page of public blogs matching ``keyword``, best match first."""
+    alias = router.db_for_read(Blog)
+
+    with connections[alias].cursor() as cursor:
+        ids = _backend(alias).search(cursor, keyword, (page - 1) * per_page, per_page + 1)
+
+    blogs = Blog.objects.in_bulk(ids[:per_page])
+
+    return SearchPage([blogs[pk] for pk in ids[:per_page] if pk in blogs], page, len(ids) > per_page)
+
+
+def search_users(keyword, limit=USER_LIMIT):
+    """Return users whose name starts with ``keyword``, ignoring case, using the ``username_key`` index.
+
+    Only prefixes match: "ali" finds "Alice" but not "Malice".
+    """
+    if not keyword:
+        return []
+
+    keyword = keyword.lower()
+    return list(User.objects.filter(username_key__gte=keyword, username_key__lt=keyword + u'\U0010ffff')
+                .order_by('username_key')[:limit])
+
+
+def rebuild():
+    alias = router.db_for_write(Blog)
+    backend = _backend(alias)
+    count = 0
+
+    with connections[alias].cursor() as cursor:
+        for blog in Blog.objects.only('id', 'blog_title', 'blog_content', 'blog_private').iterator():
+            backend.index(cursor, blog)
+            count += 1
+
+    return count
+
+
+@receiver(post_save, sender=Blog)
+def index_blog(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or INDEXED_FIELDS.intersection(update_fields):
+        tasks.submit(reindex, instance.id)
+
+
+@receiver(post_delete, sender=Blog)
+def remove_blog(sender, instance, **kwargs):
+    tasks.submit(reindex, instance.id)
@@ -0,0 +1,110 @@
+"""
+Runs side effects (counters, notifications, feed fan-out, search indexing,
+media processing) off the request path.
+
+``submit`` stores the call as a ``Task`` row in the caller's transaction, so
+it exists exactly when the write that caused it commits, and
+``manage.py run_worker`` executes it later. A task runs in a transaction
+that also marks it done, so its database effects apply once; a failing one
+is retried with exponential backoff up to ``settings.TASK_MAX_ATTEMPTS``
+times. ``key`` makes a submission idempotent: a second task with the same
+key is dropped. With ``settings.TASKS_ALWAYS_EAGER`` (for setups without a
+worker, and tests that check the effects) calls run inline instead.
+"""
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from newp import instrumentation
+
+from .counters import counter_queue
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+
+def submit(func, *args, **kwargs):
+    """Run ``func(*args)`` in the background; ``func`` must be a module-level
+    function and ``args`` JSON serializable.
+
+    Pass ``key`` to drop the call if a task with that key was already submitted.
+    """
+    key = kwargs.pop('key', None)
+
+    if settings.TASKS_ALWAYS_EAGER:
+        with instrumentation.unbudgeted():
+            func(*args)
+        return
+
+    name = '{0}.{1}'.format(func.__module__, func.__name__)
+    try:
+        with transaction.atomic():
+            Task.objects.create(name=name, args=json.dumps(args), key=key, run_at=timezone.now())
+    except IntegrityError:
+        if key is None:
+            raise
+
+
+def _claim(task, now):
+    """Lease ``task`` to this worker; False if another worker holds it."""
+    lease = now + timedelta(seconds=settings.TASK_LEASE_SECONDS)
+    return Task.objects.filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                               pk=task.pk, status=Task.PENDING).update(locked_until=lease) == 1
+
+
+def _fail(task, now):
+    task.attempts += 1
+    task.last_error = traceback.format_exc()
+    task.locked_until = None
+    if task.attempts >= settings.TASK_MAX_ATTEMPTS:
+        task.status = Task.FAILED
+        logger.error('Task %s %s failed for good', task.pk, task.name)
+    else:
+        task.run_at = now + timedelta(seconds=settings.TASK_RETRY_DELAY * 2 ** (task.attempts - 1))
+    task.save(update_fields=['attempts', 'last_error', 'locked_until', 'status', 'run_at'])
+
+
+def run(task):
+    """Execute a claimed task and record the outcome."""
+    try:
+        # Counter deltas commit with the task rather than in a later queue flush the process may not live to see.
+        with transaction.atomic(), counter_queue.writing_through():
+            import_string(task.name)(*json.loads(task.args))
+            Task.objects.filter(pk=task.pk).update(status=Task.DONE, locked_until=None)
+    except Exception:
+        logger.exception('Task %s %s failed', task.pk, task.name)
+        _fail(task, timezone.now())
+        return False
+
+    return True
+
+
+def run_pending(limit=100):
+    """Run up to ``limit`` due tasks; return how many ran."""
+    now = timezone.now()
+    due = Task.objects.filter(status=Task.PENDING, run_at__lte=now).order_by('run_at', 'id')[:limit]
+    count = 0
+
+    for task in list(due):
+        close_old_connections()
+        if _claim(task, now):
+            run(task)
+            count += 1
+
+    return count
+
+
+def prune():
+    """Delete finished tasks past ``settings.TASK_KEEP_DONE``; their keys stop deduplicating then."""
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_KEEP_DONE)
+    deleted, _ = Task.objects.filter(status=Task.DONE, run_at__lt=cutoff).delete()
+
+    return deleted
@@ -0,0 +1,21 @@
+from django import template
+from django.utils.html import format_html
+
+from blog import avatars
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(user, size=64):
+    """Render ``user``'s photo at ``size`` px, preferring WebP where the browser supports it."""
+    img = format_html('<img src="{0}" width="{1}" height="{1}" alt="{2}"/>', avatars.url(user, size), size,
+                      user.username)
+
+    if not user.avatar_hash or len(avatars.FORMATS) == 1:
+        return img
+
+    return format_html('<picture><source srcset="{0}" type="image/webp"/>{1}</picture>',
+                       avatars.url(user, size, 'webp'), img)
+
@@ -1,3 +1,1049 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import six, timezone
+from PIL import Image
+
+from newp import instrumentation
+from newp.routers import PIN_COOKIE, ReplicaMiddleware, ReplicaRouter
+
+from . import (avatars, concurrent, effects, graph, leaderboard, likes, media, search, tasks, timeline, trending,
+               uploads)
+from .counters import CounterBuffer, blog_counters, counter_queue, view_counts
+from .management.commands import run_worker
+from .models import (Blog, Comment, CounterShard, FollowSuggestion, LikeRelationship, Task, Timeline, TrendingBucket,
+                     User)
+from .pagination import PAGE_SIZE, CursorPaginator, InvalidCursor
+
 
 # Create your tests here.
+@override_settings(VIEW_COUNT_FLUSH_SIZE=1000, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class BlogDetailQueryTests(TestCase):
+    # session, auth user, blog with its related rows, liked check, comment page
+    QUERIES = 5
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        original = Blog.objects.create(blog_title='original', blog_author=self.author, blog_postdate=timezone.now())
+        self.blog = Blog.objects.create(blog_title='forward', blog_author=self.author, blog_postdate=timezone.now(),
+                                        fwd_blog=original)
+        self.url = reverse('blog:blog', kwargs={'b_id': self.blog.id, 'slug': 'view'})
+        self.client.login(username='reader', password='pw')
+
+    def tearDown(self):
+        view_counts.flush()
+
+    def comment(self, count):
+        for i in range(count):
+            Comment.objects.create(comment_author=self.reader, comment_blog=self.blog, comment_content=str(i))
+
+    def test_query_count_does_not_grow_with_comments(self):
+        self.client.get(self.url)
+
+        self.comment(1)
+        with self.assertNumQueries(self.QUERIES):
+            self.client.get(self.url)
+
+        self.comment(30)
+        with self.assertNumQueries(self.QUERIES):
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(response.context['comment_list']), 20)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, VIEW_COUNT_FLUSH_SIZE=1000, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class QueryBudgetTests(TestCase):
+    # Any request over its settings.QUERY_BUDGETS entry raises QueryBudgetExceeded.
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.client.login(username='reader', password='pw')
+        self.client.post(reverse('blog:user', kwargs={'u_id': self.author.id, 'slug': 'follow'}))
+        self.blog = Blog.objects.create(blog_title='title', blog_content='content', blog_author=self.author,
+                                        blog_postdate=timezone.now())
+
+    def tearDown(self):
+        view_counts.flush()
+
+    def blog_url(self, slug):
+        return reverse('blog:blog', kwargs={'b_id': self.blog.id, 'slug': slug})
+
+    def test_pages(self):
+        urls = [
+            reverse('blog:index'),
+            self.blog_url('view'),
+            reverse('blog:user', kwargs={'u_id': self.author.id, 'slug': 'homepage'}),
+            reverse('blog:usercontrol', kwargs={'slug': 'following'}),
+            reverse('blog:usercontrol', kwargs={'slug': 'search'}) + '?keyword=title',
+            reverse('blog:news'),
+            reverse('blog:detailnews', kwargs={'slug': 'likes'}),
+        ]
+
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    def test_writes(self):
+        self.client.post(self.blog_url('like'))
+        self.client.post(self.blog_url('comment'), {'comment_author_id': self.reader.id, 'content': 'comment'})
+        self.client.post(self.blog_url('forward'), {'fwdcontent': 'forward', 'fwdprivate': '0'})
+        self.client.post(reverse('blog:writeblog'), {'title': 'new', 'content': 'content', 'private': 'False'})
+        self.client.post(reverse('blog:likes'), {'unlike': [self.blog.id]})
+
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_inline_tasks_are_not_budgeted(self):
+        self.client.post(reverse('blog:likes'), {'like': [self.blog.id]})
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class LikeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.blogs = [Blog.objects.create(blog_title=str(i), blog_author=self.author, blog_postdate=timezone.now())
+                      for i in range(3)]
+        self.client.login(username='reader', password='pw')
+
+    def counts(self):
+        blog_counters.compact()
+        return ([(blog.like_count, blog.popularity) for blog in Blog.objects.order_by('id')],
+                User.objects.get(pk=self.author.id).like_news)
+
+    def test_toggle(self):
+        url = reverse('blog:blog', kwargs={'b_id': self.blogs[0].id, 'slug': 'like'})
+
+        self.client.post(url)
+        self.assertEqual(self.counts(), ([(1, 1), (0, 0), (0, 0)], 1))
+
+        self.client.post(url)
+        self.assertEqual(self.counts(), ([(0, 0), (0, 0), (0, 0)], 0))
+
+    def test_batch_is_idempotent(self):
+        ids = [blog.id for blog in self.blogs]
+
+        response = self.client.post(reverse('blog:likes'), {'like': ids[:2]})
+        self.assertEqual(response.json(), {'liked': ids[:2], 'unliked': []})
+
+        response = self.client.post(reverse('blog:likes'), {'like': ids, 'unlike': [ids[0], ids[0]]})
+        self.assertEqual(response.json(), {'liked': [ids[2]], 'unliked': [ids[0]]})
+        self.assertEqual(self.counts(), ([(0, 0), (1, 1), (1, 1)], 2))
+
+    def test_duplicate_like_is_rejected(self):
+        LikeRelationship.objects.create(to_blog=self.blogs[0], from_user=self.reader)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LikeRelationship.objects.create(to_blog=self.blogs[0], from_user=self.reader)
+
+
+def failing_task():
+    raise ValueError('task failed')
+
+
+@override_settings(TASK_MAX_ATTEMPTS=2, TASK_RETRY_DELAY=0)
+class TaskTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.blog = Blog.objects.create(blog_title='t', blog_author=self.author, blog_postdate=timezone.now())
+        Task.objects.all().delete()
+
+    def test_runs_once_per_key(self):
+        tasks.submit(effects.commented, self.blog.id, key='commented:1')
+        tasks.submit(effects.commented, self.blog.id, key='commented:1')
+        self.assertEqual(Blog.objects.get(pk=self.blog.id).comment_count, 0)
+
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(tasks.run_pending(), 0)
+        blog_counters.compact()
+        self.assertEqual(Blog.objects.get(pk=self.blog.id).comment_count, 1)
+
+        tasks.submit(effects.commented, self.blog.id, key='commented:1')
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_retries_then_fails(self):
+        tasks.submit(failing_task)
+
+        with self.assertLogs('blog.tasks', 'ERROR'):
+            tasks.run_pending()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertIn('task failed', task.last_error)
+
+        with self.assertLogs('blog.tasks', 'ERROR'):
+            tasks.run_pending()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+    def test_periodic_jobs_run_under_load(self):
+        job = mock.Mock()
+        with mock.patch.object(tasks, 'run_pending', side_effect=[100, 100, 0]), \
+                mock.patch.object(run_worker, 'periodic_jobs', return_value=[(0, job)]):
+            call_command('run_worker', once=True, stdout=six.StringIO())
+
+        self.assertEqual(job.call_count, 3)
+
+    def test_failing_periodic_job_does_not_stop_the_worker(self):
+        failing = mock.Mock(side_effect=DatabaseError('database is locked'), __name__='compact')
+        job = mock.Mock()
+        with mock.patch.object(tasks, 'run_pending', side_effect=[100, 0]), \
+                mock.patch.object(run_worker, 'periodic_jobs', return_value=[(0, failing), (0, job)]), \
+                self.assertLogs('blog.management.commands.run_worker', 'ERROR'):
+            call_command('run_worker', once=True, stdout=six.StringIO())
+
+        self.assertEqual((failing.call_count, job.call_count), (2, 2))
+
+
+@override_settings(COUNTER_SHARDS=4)
+class ShardedCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.blog = Blog.objects.create(blog_title='t', blog_author=self.author, blog_postdate=timezone.now(),
+                                        like_count=5)
+
+    def test_compact_folds_shards_into_columns(self):
+        for i in range(20):
+            blog_counters.add([self.blog.id], like_count=1, popularity=2)
+        blog_counters.add([self.blog.id], like_count=-1)
+
+        self.assertLessEqual(CounterShard.objects.count(), 8)
+        self.assertEqual(blog_counters.pending([self.blog.id]), {self.blog.id: {'like_count': 19, 'popularity': 40}})
+
+        self.assertEqual(blog_counters.compact(), 1)
+        blog = Blog.objects.get(pk=self.blog.id)
+        self.assertEqual((blog.like_count, blog.popularity), (24, 40))
+        self.assertEqual(blog_counters.pending([self.blog.id]), {self.blog.id: {}})
+        self.assertFalse(CounterShard.objects.exists())
+
+
+@override_settings(TRENDING_HALF_LIFE=6)
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.old, self.new, self.private = [
+            Blog.objects.create(blog_title=title, blog_author=self.author, blog_postdate=timezone.now(),
+                                blog_private=title == 'private')
+            for title in ('old', 'new', 'private')
+        ]
+
+    def test_recent_activity_outranks_old(self):
+        # 40 likes two days ago decay to 40 / 2 ** 8; 2 comments now score 2.
+        two_days_ago = timezone.now() - datetime.timedelta(hours=48)
+        TrendingBucket.objects.create(blog=self.old, hour=two_days_ago, score=40)
+        trending.record('comment', {self.new.id: 2, self.private.id: 5})
+
+        self.assertEqual(trending.recompute(), 1)
+        self.assertEqual([blog.blog_title for blog in trending.top('day')], ['new'])
+        self.assertEqual([blog.blog_title for blog in trending.top('week')], ['new', 'old'])
+        self.assertTrue(1 < Blog.objects.get(pk=self.new.id).trending_score <= 2)
+
+    def test_unlike_cancels_like(self):
+        trending.record('like', {self.new.id: 1})
+        trending.record('like', {self.new.id: -1})
+
+        trending.recompute()
+        self.assertEqual(trending.top('day'), [])
+
+
+class BatchLoaderTests(TestCase):
+    # List pages run the same number of queries however many rows they show.
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.original = Blog.objects.create(blog_title='original', blog_author=self.author,
+                                            blog_postdate=timezone.now())
+        self.client.login(username='author', password='pw')
+
+    def forward(self, count):
+        for i in range(count):
+            user = User.objects.create_user('fan{0}'.format(User.objects.count()), password='pw')
+            Blog.objects.create(blog_title='fwd', blog_author=user, blog_postdate=timezone.now(),
+                                fwd_blog=self.original)
+            LikeRelationship.objects.create(to_blog=self.original, from_user=user, to_author=self.author.id)
+
+    def queries(self, url):
+        # Fill the sidebar cache first; news pages mark their rows read, so they can't be warmed up.
+        self.client.get(reverse('blog:index'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_news_pages(self):
+        for slug in ('forwards', 'likes'):
+            url = reverse('blog:detailnews', kwargs={'slug': slug})
+            self.forward(1)
+            few = self.queries(url)
+            self.forward(5)
+            self.assertEqual(self.queries(url), few, slug)
+
+    def test_homepage_forwards(self):
+        fan = User.objects.create_user('fan', password='pw')
+        url = reverse('blog:user', kwargs={'u_id': fan.id, 'slug': 'homepage'})
+        Blog.objects.create(blog_title='fwd', blog_author=fan, blog_postdate=timezone.now(), fwd_blog=self.original)
+        few = self.queries(url)
+
+        for i in range(5):
+            other = Blog.objects.create(blog_title='other', blog_author=User.objects.create_user(str(i)),
+                                        blog_postdate=timezone.now())
+            Blog.objects.create(blog_title='fwd', blog_author=fan, blog_postdate=timezone.now(), fwd_blog=other)
+        self.assertEqual(self.queries(url), few)
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = dict((name, User.objects.create_user(name, password='pw')) for name in 'abcde')
+
+    def follow(self, pairs):
+        for pair in pairs.split():
+            graph.follow(self.users[pair[0]], self.users[pair[1]])
+
+    def ids(self, users):
+        return [user.username for user in users]
+
+    def test_lookups(self):
+        self.follow('ab ba ac')
+
+        self.assertTrue(graph.is_following(self.users['a'].id, self.users['c'].id))
+        self.assertFalse(graph.is_following(self.users['c'].id, self.users['a'].id))
+        self.assertEqual(self.ids(graph.mutuals(self.users['a'].id)), ['b'])
+        self.assertEqual(graph.following_among(self.users['a'].id, [u.id for u in self.users.values()]),
+                         set([self.users['b'].id, self.users['c'].id]))
+
+    def test_suggestions(self):
+        # a follows b and c; both follow d, only c follows e, and a already follows c.
+        self.follow('ab ac bd cd ce bc')
+
+        self.assertEqual(graph.update_suggestions(), 2)
+        self.assertEqual([(user.username, user.common_count) for user in graph.suggestions(self.users['a'].id)],
+                         [('d', 2), ('e', 1)])
+
+        self.follow('ad')
+        self.assertEqual(self.ids(graph.suggestions(self.users['a'].id)), ['e'])
+
+        graph.unfollow(self.users['a'], self.users['b'])
+        graph.unfollow(self.users['a'], self.users['c'])
+        graph.unfollow(self.users['a'], self.users['d'])
+        graph.update_suggestions()
+        self.assertFalse(FollowSuggestion.objects.filter(user=self.users['a']).exists())
+        self.assertEqual(graph.suggestions(self.users['a'].id), [])
+
+    def test_homepage(self):
+        self.follow('ab ba')
+        self.client.login(username='a', password='pw')
+        response = self.client.get(reverse('blog:user', kwargs={'u_id': self.users['b'].id, 'slug': 'homepage'}))
+
+        self.assertTrue(response.context['follow'])
+        self.assertTrue(response.context['followed_by'])
+        self.assertEqual(self.ids(response.context['mutuals']), ['a'])
+        view_counts.flush()
+
+
+MP3 = b'ID3\x03\x00' + b'\x00' * 100
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        overridden = override_settings(MEDIA_ROOT=directory, MUSIC_UPLOAD_DIR=os.path.join(directory, 'parts'))
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.other = User.objects.create_user('other', password='pw')
+        self.client.login(username='owner', password='pw')
+
+    def start(self):
+        return self.client.post(reverse('blog:musicupload')).json()['upload_id']
+
+    def chunk(self, upload_id, offset, data):
+        url = reverse('blog:musicupload', kwargs={'upload_id': upload_id, 'slug': 'chunk'})
+        return self.client.post('{0}?offset={1}'.format(url, offset), data, content_type='application/octet-stream')
+
+    def finish(self, upload_id):
+        return self.client.post(reverse('blog:musicupload', kwargs={'upload_id': upload_id, 'slug': 'finish'}))
+
+    def upload(self):
+        upload_id = self.start()
+        self.chunk(upload_id, 0, MP3)
+        return self.finish(upload_id).json()['music_id']
+
+    def test_offset_mismatch(self):
+        upload_id = self.start()
+        self.assertEqual(self.chunk(upload_id, 0, MP3[:50]).json()['offset'], 50)
+
+        self.assertEqual(self.chunk(upload_id, 10, MP3[50:]).status_code, 409)
+        self.assertEqual(self.chunk(upload_id, 50, MP3[50:]).json()['offset'], len(MP3))
+
+    def test_append_after_finish(self):
+        upload_id = self.start()
+        self.chunk(upload_id, 0, MP3)
+        self.assertEqual(self.finish(upload_id).status_code, 200)
+
+        self.assertEqual(self.chunk(upload_id, len(MP3), MP3).status_code, 404)
+        self.assertEqual(self.finish(upload_id).status_code, 404)
+
+    def test_rejects_non_mp3(self):
+        upload_id = self.start()
+
+        self.assertEqual(self.chunk(upload_id, 0, b'GIF89a' + b'\x00' * 100).status_code, 415)
+        self.assertEqual(self.chunk(upload_id, 0, MP3).status_code, 404)
+
+    def test_attach_music_of_another_user(self):
+        music_id = self.upload()
+        data = {'title': 'title', 'content': 'content', 'private': 'True', 'music_id': music_id}
+        self.client.post(reverse('blog:writeblog'), data)
+
+        self.client.login(username='other', password='pw')
+        self.assertEqual(self.client.post(reverse('blog:writeblog'), data).status_code, 403)
+        self.assertFalse(Blog.objects.filter(blog_author=self.other).exists())
+
+        self.client.login(username='owner', password='pw')
+        self.assertEqual(self.client.post(reverse('blog:writeblog'), data).status_code, 302)
+        self.assertEqual(Blog.objects.filter(blog_author=self.owner, relate_music_id=music_id).count(), 2)
+
+    def test_prune(self):
+        stale, fresh = self.start(), self.start()
+        stale_path = os.path.join(settings.MUSIC_UPLOAD_DIR, '{0}-{1}.part'.format(self.owner.id, stale))
+        os.utime(stale_path, (0, 0))
+
+        self.assertEqual(uploads.prune(), 1)
+        self.assertFalse(os.path.exists(stale_path))
+        self.assertEqual(self.chunk(fresh, 0, MP3).status_code, 200)
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class NotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.blog = Blog.objects.create(blog_title='title', blog_author=self.author, blog_postdate=timezone.now())
+
+    def tearDown(self):
+        view_counts.flush()
+
+    def news(self, user):
+        user = User.objects.get(pk=user.id)
+        return (user.like_news, user.comment_news, user.forward_news)
+
+    def react(self, username, blog):
+        self.client.login(username=username, password='pw')
+        user_id = User.objects.get(username=username).id
+        for slug, data in (('like', {}), ('comment', {'comment_author_id': user_id, 'content': 'comment'}),
+                           ('forward', {'fwdcontent': 'forward', 'fwdprivate': '0'})):
+            self.client.post(reverse('blog:blog', kwargs={'b_id': blog.id, 'slug': slug}), data)
+
+    def test_read_resets(self):
+        self.react('reader', self.blog)
+        self.assertEqual(self.news(self.author), (1, 1, 1))
+
+        self.client.login(username='author', password='pw')
+        self.assertEqual(self.client.get(reverse('blog:news')).context['like_news_count'], 1)
+        for slug in ('likes', 'comments', 'forwards'):
+            self.client.get(reverse('blog:detailnews', kwargs={'slug': slug}))
+        self.assertEqual(self.news(self.author), (0, 0, 0))
+
+    def test_delete_takes_back_news(self):
+        self.react('reader', self.blog)
+        forward = Blog.objects.get(fwd_blog=self.blog)
+        User.objects.create_user('fan', password='pw')
+        self.react('fan', forward)
+        self.assertEqual(self.news(self.reader), (1, 1, 1))
+
+        self.client.login(username='author', password='pw')
+        self.client.post(reverse('blog:blog', kwargs={'b_id': self.blog.id, 'slug': 'delete'}))
+
+        self.assertFalse(Blog.objects.exists())
+        self.assertEqual(self.news(self.author), (0, 0, 0))
+        self.assertEqual(self.news(self.reader), (0, 0, 0))
+
+
+@override_settings(VIEW_COUNT_FLUSH_SIZE=3, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class CounterBufferTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.blogs = [Blog.objects.create(blog_title=str(i), blog_author=author, blog_postdate=timezone.now())
+                      for i in range(3)]
+        self.buffer = CounterBuffer('view_count')
+
+    def views(self):
+        return list(Blog.objects.order_by('id').values_list('view_count', flat=True))
+
+    def test_flushes_at_size(self):
+        self.buffer.incr(self.blogs[0].id)
+        self.buffer.incr(self.blogs[0].id)
+        self.buffer.incr(self.blogs[1].id)
+        self.assertEqual((self.views(), self.buffer.pending(self.blogs[0].id)), ([0, 0, 0], 2))
+
+        self.buffer.incr(self.blogs[2].id)
+        self.assertEqual((self.views(), self.buffer.pending(self.blogs[0].id)), ([2, 1, 1], 0))
+
+    def test_keeps_counts_when_the_write_fails(self):
+        self.buffer.incr(self.blogs[0].id)
+
+        with mock.patch('blog.counters.add_by_pk', side_effect=DatabaseError('database is locked')), \
+                self.assertLogs('blog.counters', 'ERROR'):
+            self.buffer.flush()
+        self.assertEqual((self.views(), self.buffer.pending(self.blogs[0].id)), ([0, 0, 0], 1))
+
+        self.buffer.flush()
+        self.assertEqual((self.views(), self.buffer.pending(self.blogs[0].id)), ([1, 0, 0], 0))
+
+
+class MediaServeTests(SimpleTestCase):
+    DATA = bytes(range(100))
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        overridden = override_settings(MEDIA_ROOT=directory, MEDIA_ACCEL=None)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+        with open(os.path.join(directory, 'song.mp3'), 'wb') as handle:
+            handle.write(self.DATA)
+
+    def serve(self, **headers):
+        response = media.serve(RequestFactory().get('/', **headers), 'song.mp3', etag='abc')
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_full(self):
+        response, body = self.serve()
+        self.assertEqual((response.status_code, body, response['Accept-Ranges']), (200, self.DATA, 'bytes'))
+
+    def test_ranges(self):
+        for header, start, end in (('bytes=10-', 10, 99), ('bytes=-10', 90, 99), ('bytes=90-500', 90, 99),
+                                   ('bytes=5-9', 5, 9)):
+            response, body = self.serve(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(body, self.DATA[start:end + 1], header)
+            self.assertEqual(response['Content-Range'], 'bytes {0}-{1}/100'.format(start, end), header)
+
+    def test_unsatisfiable_range(self):
+        response, body = self.serve(HTTP_RANGE='bytes=100-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+
+    def test_if_range_mismatch_sends_everything(self):
+        response, body = self.serve(HTTP_RANGE='bytes=10-', HTTP_IF_RANGE='"old"')
+        self.assertEqual((response.status_code, body), (200, self.DATA))
+
+    def test_not_modified(self):
+        for header in ('"abc"', 'W/"abc"', '"other", W/"abc"', '*'):
+            response, body = self.serve(HTTP_IF_NONE_MATCH=header)
+            self.assertEqual((response.status_code, body), (304, b''), header)
+
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"other"')[0].status_code, 200)
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+
+    def post(self, title, private=False):
+        self.client.login(username='author', password='pw')
+        self.client.post(reverse('blog:writeblog'), {'title': title, 'content': 'content', 'private': str(private)})
+        return Blog.objects.get(blog_title=title)
+
+    def timeline(self, user=None):
+        return [blog.blog_title for blog in timeline.read((user or self.reader).id)]
+
+    def test_post_reaches_followers(self):
+        graph.follow(self.reader, self.author)
+        self.post('public')
+        self.post('private', private=True)
+
+        self.assertEqual(self.timeline(), ['public'])
+        self.assertEqual(self.timeline(self.author), [])
+
+    def test_unfollow_and_delete_remove_entries(self):
+        graph.follow(self.reader, self.author)
+        self.post('first')
+        second = self.post('second')
+
+        self.client.post(reverse('blog:blog', kwargs={'b_id': second.id, 'slug': 'delete'}))
+        self.assertEqual(self.timeline(), ['first'])
+
+        graph.unfollow(self.reader, self.author)
+        self.assertFalse(Timeline.objects.filter(owner=self.reader).exists())
+
+    def test_follow_backfills(self):
+        self.post('old')
+        self.post('older-private', private=True)
+        self.post('new')
+
+        graph.follow(self.reader, self.author)
+        self.assertEqual(self.timeline(), ['new', 'old'])
+
+        call_command('backfill_timeline', clear=True, limit=1, stdout=six.StringIO())
+        self.assertEqual(self.timeline(), ['new'])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pw')
+        now = timezone.now()
+        # Most blogs share one timestamp, so only the id orders them, across a page boundary too.
+        dates = [now] * 22 + [now - datetime.timedelta(seconds=1), now + datetime.timedelta(seconds=1)]
+        for i, date in enumerate(dates):
+            Blog.objects.create(blog_title=str(i), blog_author=self.author, blog_postdate=date)
+        self.expected = list(Blog.objects.order_by('-blog_postdate', '-id').values_list('id', flat=True))
+
+    def test_pages_neither_overlap_nor_skip(self):
+        paginator = CursorPaginator(Blog.objects.all(), 'blog_postdate', per_page=5)
+        seen = []
+        cursor = None
+
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(blog.id for blog in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, self.expected)
+
+    def test_homepage_pages(self):
+        url = reverse('blog:user', kwargs={'u_id': self.author.id, 'slug': 'homepage'})
+        seen = []
+        response = self.client.get(url)
+
+        while True:
+            page = response.context['Blog_list']
+            seen.extend(blog.id for blog in page)
+            if not page.has_next:
+                break
+            self.assertContains(response, '?cursor={0}'.format(page.next_cursor))
+            response = self.client.get(url, {'cursor': page.next_cursor})
+
+        self.assertEqual(seen, self.expected)
+        self.assertGreater(len(seen), PAGE_SIZE)
+        view_counts.flush()
+
+    def test_bad_cursor(self):
+        for cursor in ('x', '1-2-3', '99999999999999999999-1'):
+            with self.assertRaises(InvalidCursor):
+                CursorPaginator(Blog.objects.all(), 'blog_postdate').page(cursor)
+
+        url = reverse('blog:user', kwargs={'u_id': self.author.id, 'slug': 'homepage'})
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code, 404)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.blogs = [Blog.objects.create(blog_title=str(i), blog_author=self.author, blog_postdate=timezone.now())
+                      for i in range(leaderboard.SIZE + 1)]
+        # Blog i gets i + 1 likes.
+        trending.record('like', dict((blog.id, i + 1) for i, blog in enumerate(self.blogs)))
+
+    def titles(self):
+        return [blog.blog_title for blog in leaderboard.top()]
+
+    def test_ranks_by_score(self):
+        self.assertEqual(self.titles(), ['5', '4', '3', '2', '1'])
+
+        trending.record('forward', {self.blogs[0].id: 10})
+        trending.recompute()
+        self.assertEqual(self.titles(), ['0', '5', '4', '3', '2'])
+
+    def test_deleted_blog_leaves(self):
+        forward = Blog.objects.create(blog_title='fwd', blog_author=self.author, blog_postdate=timezone.now(),
+                                      fwd_blog=self.blogs[4])
+        trending.record('like', {forward.id: 100})
+        self.assertEqual(self.titles(), ['fwd', '5', '4', '3', '2'])
+
+        self.client.login(username='author', password='pw')
+        self.client.post(reverse('blog:blog', kwargs={'b_id': self.blogs[4].id, 'slug': 'delete'}))
+
+        self.assertEqual(self.titles(), ['5', '3', '2', '1', '0'])
+
+
+class FollowCounterTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user('reader')
+        self.author = User.objects.create_user('author')
+
+    def counts(self):
+        return [(user.following_count, user.follower_count) for user in
+                User.objects.filter(pk__in=[self.reader.id, self.author.id]).order_by('id')]
+
+    def test_follow_and_unfollow(self):
+        graph.follow(self.reader, self.author)
+        graph.follow(self.reader, self.author)
+        self.assertEqual(self.counts(), [(1, 0), (0, 1)])
+
+        graph.unfollow(self.reader, self.author)
+        graph.unfollow(self.reader, self.author)
+        self.assertEqual(self.counts(), [(0, 0), (0, 0)])
+
+    def test_reconcile_repairs_drift(self):
+        graph.follow(self.reader, self.author)
+        User.objects.filter(pk=self.reader.id).update(following_count=7, like_news=3)
+        User.objects.filter(pk=self.author.id).update(follower_count=0)
+
+        out = six.StringIO()
+        call_command('reconcile_counters', stdout=out)
+
+        self.assertEqual(self.counts(), [(1, 0), (0, 1)])
+        self.assertEqual(User.objects.get(pk=self.reader.id).like_news, 0)
+        self.assertIn('Repaired follow counters of 2 users.', out.getvalue())
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class SearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pw')
+        self.blog = Blog.objects.create(blog_title='Autumn walk', blog_content='leaves falling in the park',
+                                        blog_author=self.author, blog_postdate=timezone.now())
+        Blog.objects.create(blog_title='Recipes', blog_content='apple pie', blog_author=self.author,
+                            blog_postdate=timezone.now())
+
+    def found(self, keyword):
+        return [blog.id for blog in search.search_blogs(keyword)]
+
+    def indexed(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM {0} WHERE rowid = %s'.format(search.SQLITE_TABLE), [self.blog.id])
+            return cursor.fetchone()[0]
+
+    def test_round_trip(self):
+        self.assertEqual(self.found('leaves'), [self.blog.id])
+        self.assertEqual(self.found('autum'), [self.blog.id])
+
+        self.blog.blog_title = 'Winter walk'
+        self.blog.blog_content = 'snow'
+        self.blog.save()
+        self.assertEqual(self.found('leaves'), [])
+        self.assertEqual(self.found('winter snow'), [self.blog.id])
+
+        self.blog.blog_private = True
+        self.blog.save()
+        self.assertEqual(self.found('winter'), [])
+
+        self.blog.delete()
+        self.assertEqual(self.indexed(), 0)
+
+    def test_search_page(self):
+        response = self.client.get(reverse('blog:usercontrol', kwargs={'slug': 'search'}), {'keyword': 'apple'})
+        self.assertContains(response, 'Recipes')
+        self.assertNotContains(response, 'Autumn walk')
+
+    def test_user_search_ignores_case(self):
+        for name in ('Alice', 'alina', 'Malice'):
+            User.objects.create_user(name)
+        renamed = User.objects.create_user('bob')
+        renamed.username = 'ALIX'
+        renamed.save(update_fields=['username'])
+
+        for keyword in ('ali', 'ALI'):
+            self.assertEqual([user.username for user in search.search_users(keyword)], ['Alice', 'alina', 'ALIX'])
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class AvatarTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        overridden = override_settings(MEDIA_ROOT=directory)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+        self.first = User.objects.create_user('first')
+        self.second = User.objects.create_user('second')
+
+    def photo(self, color):
+        data = six.BytesIO()
+        Image.new('RGB', (300, 200), color).save(data, 'PNG')
+        return SimpleUploadedFile('photo.png', data.getvalue(), content_type='image/png')
+
+    def files(self, digest):
+        return [name for name in avatars._names(digest) if default_storage.exists(name)]
+
+    def age(self, digest):
+        old = time.time() - avatars.ORPHAN_AGE - 1
+        for name in self.files(digest):
+            os.utime(default_storage.path(name), (old, old))
+
+    def test_same_photo_is_stored_once(self):
+        digest = avatars.store(self.first, self.photo('red'))
+        self.assertEqual(avatars.store(self.second, self.photo('red')), digest)
+
+        self.assertEqual(len(self.files(digest)), len(avatars._names(digest)))
+        self.assertEqual(default_storage.listdir(avatars.AVATAR_DIR)[1].count(digest), 1)
+        self.assertEqual(set(User.objects.values_list('avatar_hash', flat=True)), set([digest]))
+        with Image.open(default_storage.path(avatars.variant_name(digest, 64))) as thumbnail:
+            self.assertEqual(thumbnail.size, (64, 64))
+
+    def test_replaced_photo_is_collected_when_unused(self):
+        red = avatars.store(self.first, self.photo('red'))
+        avatars.store(self.second, self.photo('red'))
+
+        avatars.store(self.first, self.photo('blue'))
+        self.assertTrue(self.files(red))
+
+        self.age(red)
+        avatars.store(self.second, self.photo('blue'))
+        self.assertEqual(self.files(red), [])
+
+    def test_recent_upload_is_not_collected(self):
+        red = avatars.store(self.first, self.photo('red'))
+        self.age(red)
+
+        with override_settings(TASKS_ALWAYS_EAGER=False):
+            avatars.store(self.second, self.photo('red'))
+        avatars.store(self.first, self.photo('blue'))
+        tasks.run_pending()
+
+        self.assertEqual(User.objects.get(pk=self.second.id).avatar_hash, red)
+        self.assertEqual(len(self.files(red)), len(avatars._names(red)))
+
+    def test_serving(self):
+        digest = avatars.store(self.first, self.photo('red'))
+        user = User.objects.get(pk=self.first.id)
+        url = avatars.url(user, 40)
+
+        self.assertEqual(url, reverse('blog:avatar', kwargs={'name': '{0}-64.jpg'.format(digest)}))
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/jpeg'))
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+
+        missing = reverse('blog:avatar', kwargs={'name': '{0}-64.jpg'.format('0' * 64)})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class FragmentCacheTests(TestCase):
+    # Cached fragments are keyed on versions, so changes show without waiting for FRAGMENT_CACHE_TTL.
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        graph.follow(self.reader, self.author)
+        self.blog = Blog.objects.create(blog_title='before', blog_author=self.author, blog_postdate=timezone.now())
+        effects.posted(self.blog.id)
+        self.client.login(username='reader', password='pw')
+
+    def index(self):
+        return self.client.get(reverse('blog:index')).content.decode()
+
+    def test_edited_post_card(self):
+        self.assertIn('before', self.index())
+
+        self.blog.blog_title = 'after'
+        self.blog.save()
+        self.assertIn('after', self.index())
+
+    def test_follow_list(self):
+        self.index()
+        graph.follow(self.reader, User.objects.create_user('newcomer'))
+
+        self.assertIn('newcomer', self.index())
+
+    def test_popularity(self):
+        trending.record('like', {self.blog.id: 1})
+        Blog.objects.filter(pk=self.blog.id).update(popularity=1)
+        trending.recompute()
+        self.assertIn('Popularity: 1', self.index())
+
+        Blog.objects.filter(pk=self.blog.id).update(popularity=2)
+        trending.recompute()
+        self.assertIn('Popularity: 2', self.index())
+
+
+class BenchmarkTests(TransactionTestCase):
+    # The benchmark drives the pages outside a transaction, so their queries run on the pool threads.
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        call_command('generate_social_graph', users=20, posts=3, days=2, stdout=six.StringIO())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        view_counts.flush()
+
+    def benchmark(self):
+        path = os.path.join(self.directory, 'baseline.json')
+        call_command('benchmark', requests=2, warmup=1, save_baseline=path, stdout=six.StringIO())
+        with open(path) as baseline:
+            return dict((name, result['queries']) for name, result in json.load(baseline).items())
+
+    def test_trending_is_seeded(self):
+        self.assertTrue(TrendingBucket.objects.exists())
+        self.assertTrue(trending.top('week'))
+
+    def test_counts_queries_on_pool_threads(self):
+        gathered = self.benchmark()
+        with mock.patch.object(concurrent, 'executor', None):
+            self.assertEqual(self.benchmark(), gathered)
+
+
+class CounterQueueTests(TransactionTestCase):
+    # Queued deltas are handed over on commit, which TestCase's wrapping transaction never reaches.
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.blog = Blog.objects.create(blog_title='t', blog_author=self.author, blog_postdate=timezone.now())
+
+    def counts(self):
+        return Blog.objects.values_list('like_count', 'popularity').get(pk=self.blog.id)
+
+    @override_settings(COUNTER_QUEUE_INTERVAL=60)
+    def test_queued_until_flush(self):
+        counter_queue.add(Blog, self.blog.id, like_count=1, popularity=1)
+        counter_queue.add(Blog, self.blog.id, popularity=2)
+        self.assertEqual(self.counts(), (0, 0))
+
+        counter_queue.flush()
+        self.assertEqual(self.counts(), (1, 3))
+
+    @override_settings(COUNTER_QUEUE_INTERVAL=60)
+    def test_rolled_back_deltas_are_dropped(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            counter_queue.add(Blog, self.blog.id, popularity=1)
+            raise ValueError
+
+        counter_queue.flush()
+        self.assertEqual(self.counts(), (0, 0))
+
+    @override_settings(COUNTER_QUEUE_INTERVAL=60)
+    def test_task_deltas_commit_with_the_task(self):
+        tasks.submit(likes.count, [self.blog.id], 1, [[self.author.id, 1]])
+        tasks.run_pending()
+
+        self.assertEqual(self.counts(), (1, 1))
+        self.assertEqual(User.objects.get(pk=self.author.id).like_news, 1)
+
+    @override_settings(COUNTER_QUEUE_INTERVAL=60)
+    def test_worker_flushes_on_exit(self):
+        counter_queue.add(Blog, self.blog.id, like_count=1, popularity=1)
+        call_command('run_worker', once=True, stdout=six.StringIO())
+
+        self.assertEqual(self.counts(), (1, 1))
+
+    @override_settings(COUNTER_QUEUE_INTERVAL=60)
+    def test_blog_counters_use_the_queue(self):
+        blog_counters.add([self.blog.id], like_count=1, popularity=1)
+        self.assertFalse(CounterShard.objects.exists())
+        self.assertEqual(self.counts(), (0, 0))
+
+        counter_queue.flush()
+        self.assertEqual(self.counts(), (1, 1))
+
+
+class ConcurrentContextTests(TransactionTestCase):
+    # Outside a transaction the views gather their queries on other threads and connections.
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.blog = Blog.objects.create(blog_title='gathered', blog_author=self.author, blog_postdate=timezone.now())
+        self.client.login(username='author', password='pw')
+
+    def tearDown(self):
+        view_counts.flush()
+
+    def test_pages_render(self):
+        for url in (reverse('blog:blog', kwargs={'b_id': self.blog.id, 'slug': 'view'}),
+                    reverse('blog:user', kwargs={'u_id': self.author.id, 'slug': 'homepage'})):
+            self.assertContains(self.client.get(url), 'gathered')
+
+    def test_errors_propagate(self):
+        response = self.client.get(reverse('blog:blog', kwargs={'b_id': self.blog.id + 1, 'slug': 'view'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_query_count(self):
+        # Queries on the pool threads count towards the request, as when they run in turn.
+        url = reverse('blog:user', kwargs={'u_id': self.author.id, 'slug': 'homepage'})
+        self.client.get(url)
+
+        counts = []
+        for pool in (concurrent.executor, None):
+            with mock.patch.object(concurrent, 'executor', pool):
+                instrumentation.stats.reset()
+                self.client.get(url)
+                counts.append(instrumentation.stats.as_dict()['blog:user']['queries']['max'])
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_query_count_with_full_query_log(self):
+        # Nothing resets a pool thread's query log between requests.
+        pool = ThreadPoolExecutor(max_workers=1)
+        pool.submit(lambda: connection.queries_log.extend(
+            {'sql': '', 'time': '0'} for _ in range(connection.queries_limit))).result()
+
+        recorder = instrumentation.QueryRecorder()
+        with mock.patch.object(concurrent, 'executor', pool), recorder.record():
+            concurrent.gather({'users': lambda: User.objects.count(), 'blogs': lambda: Blog.objects.count()})
+        pool.shutdown()
+
+        self.assertEqual(recorder.queries, 2)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        call_command('check_query_plans', stdout=six.StringIO())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, method, url, cookies=None):
+        request = getattr(RequestFactory(), method)(url)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(url)
+        seen = []
+
+        def view(request):
+            seen.append(ReplicaRouter().db_for_read(User))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(lambda request: middleware.process_view(request, view, (), {}) or view(request))
+        response = middleware(request)
+
+        return seen[0], response
+
+    def test_read_only_views_use_replicas(self):
+        self.assertEqual(self.route('get', reverse('blog:index'))[0], 'replica')
+        self.assertEqual(self.route('get', reverse('blog:news'))[0], 'default')
+        self.assertEqual(ReplicaRouter().db_for_read(User), 'default')
+
+    def test_writes_pin_reads_to_primary(self):
+        db, response = self.route('post', reverse('blog:writeblog'))
+        self.assertEqual(db, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        db, response = self.route('get', reverse('blog:index'), {PIN_COOKIE: '1'})
+        self.assertEqual(db, 'default')
@@ -0,0 +1,72 @@
+from operator import attrgetter
+
+from .models import Blog, Relationship, Timeline
+from .pagination import CursorPaginator, PAGE_SIZE
+
+
+# Number of rows written per INSERT when fanning out to followers.
+BATCH_SIZE = 500
+
+# How many of an author's newest blogs are copied into a timeline on follow.
+BACKFILL_LIMIT = 200
+
+
+def _insert(blog, owner_ids):
+    entries = [
+        Timeline(owner_id=owner_id, blog_id=blog.id, blog_author_id=blog.blog_author_id,
+                 blog_postdate=blog.blog_postdate)
+        for owner_id in owner_ids
+    ]
+    Timeline.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def fan_out(blog):
+    """Write a newly posted public blog into the timeline of every follower.
+
+    Followers whose timeline already has it (from a follow backfilled in the
+    meantime) are skipped.
+    """
+    if blog.blog_private:
+        return
+
+    followers = Relationship.objects.filter(to_user_id=blog.blog_author_id).values_list('from_user_id', flat=True)
+    existing = set(Timeline.objects.filter(blog_id=blog.id).values_list('owner_id', flat=True))
+    owner_ids = []
+
+    for owner_id in followers.iterator():
+        if owner_id in existing:
+            continue
+        owner_ids.append(owner_id)
+        if len(owner_ids) == BATCH_SIZE:
+            _insert(blog, owner_ids)
+            owner_ids = []
+
+    if owner_ids:
+        _insert(blog, owner_ids)
+
+
+def add_author(owner_id, author_id, limit=BACKFILL_LIMIT):
+    """Copy the newest public blogs of a just-followed author into a timeline."""
+    existing = Timeline.objects.filter(owner_id=owner_id, blog_author_id=author_id).values_list('blog_id', flat=True)
+    existing = set(existing)
+    blogs = Blog.objects.filter(blog_author_id=author_id, blog_private=False) \
+        .order_by('-blog_postdate', '-id') \
+        .values_list('id', 'blog_postdate')[:limit]
+
+    Timeline.objects.bulk_create([
+        Timeline(owner_id=owner_id, blog_id=blog_id, blog_author_id=author_id, blog_postdate=postdate)
+        for blog_id, postdate in blogs if blog_id not in existing
+    ], batch_size=BATCH_SIZE)
+
+
+def remove_author(owner_id, author_id):
+    """Drop an unfollowed author's blogs from a timeline."""
+    Timeline.objects.filter(owner_id=owner_id, blog_author_id=author_id).delete()
+
+
+def read(owner_id, cursor=None, limit=PAGE_SIZE):
+    """Return a page of blogs from a timeline, newest first."""
+    entries = Timeline.objects.filter(owner_id=owner_id).select_related('blog')
+    paginator = CursorPaginator(entries, 'blog_postdate', 'blog_id', limit, transform=attrgetter('blog'))
+
+    return paginator.page(cursor)
@@ -0,0 +1,155 @@
+"""
+Trending blogs.
+
+Likes, forwards, comments and views are recorded as weighted events in
+hourly ``TrendingBucket`` rows. A blog's score is the sum of its events
+halved every ``settings.TRENDING_HALF_LIFE`` hours, so the sidebar follows
+what is active now instead of what collected the most popularity ever.
+
+``recompute`` (run periodically by ``run_worker``) writes the score of the
+default window to ``Blog.trending_score``, ranks every window in
+``settings.TRENDING_WINDOWS`` and drops buckets older than the longest one.
+It only reads buckets inside that window and the blogs that had a score,
+so its cost follows recent activity, not the number of blogs.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .models import Blog, TrendingBucket
+
+
+WEIGHTS = {
+    'like': 1.0,
+    'forward': 2.0,
+    'comment': 1.0,
+    'view': 0.1,
+}
+
+# Blogs kept in each cached ranking; top() serves any shorter list from it.
+SIZE = 20
+
+# Maximum number of rows updated by one UPDATE ... CASE statement.
+BATCH_SIZE = 200
+
+
+def _key(window):
+    return 'blog:trending:{0}'.format(window)
+
+
+def _hour(now):
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+def record(event, amounts):
+    """Count ``event`` ('like', 'view', ...) ``amount`` times for each blog in ``amounts`` (``{blog id: amount}``)."""
+    hour = _hour(timezone.now())
+    scores = dict((blog_id, WEIGHTS[event] * amount) for blog_id, amount in amounts.items() if amount)
+
+    existing = dict(TrendingBucket.objects.filter(hour=hour, blog_id__in=list(scores)).values_list('blog_id', 'id'))
+    _add(dict((existing[blog_id], score) for blog_id, score in scores.items() if blog_id in existing))
+
+    for blog_id, score in scores.items():
+        if blog_id in existing:
+            continue
+        try:
+            with transaction.atomic():
+                TrendingBucket.objects.create(blog_id=blog_id, hour=hour, score=score)
+        except IntegrityError:
+            # Created by a concurrent request since we looked (or the blog is gone).
+            TrendingBucket.objects.filter(blog_id=blog_id, hour=hour).update(score=F('score') + score)
+
+
+def _add(values):
+    items = list(values.items())
+
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        delta = Case(*[When(pk=pk, then=Value(score)) for pk, score in batch],
+                     default=Value(0.0), output_field=FloatField())
+        TrendingBucket.objects.filter(pk__in=[pk for pk, score in batch]).update(score=F('score') + delta)
+
+
+def _scores(buckets, now, hours):
+    """Sum decayed bucket scores of public blogs over the last ``hours`` hours."""
+    since = now - timedelta(hours=hours)
+    scores = {}
+
+    for blog_id, hour, score, private in buckets:
+        if hour < since or private:
+            continue
+        age = (now - hour).total_seconds() / 3600.0
+        scores[blog_id] = scores.get(blog_id, 0.0) + score * 0.5 ** (age / settings.TRENDING_HALF_LIFE)
+
+    return scores
+
+
+def _buckets(now):
+    since = _hour(now) - timedelta(hours=max(settings.TRENDING_WINDOWS.values()))
+    return list(TrendingBucket.objects.filter(hour__gte=since)
+                .values_list('blog_id', 'hour', 'score', 'blog__blog_private'))
+
+
+def _rank(window, buckets, now):
+    scores = _scores(buckets, now, settings.TRENDING_WINDOWS[window])
+    ranked = sorted((blog_id for blog_id, score in scores.items() if score > 0),
+                    key=lambda blog_id: (scores[blog_id], blog_id), reverse=True)[:SIZE]
+    blogs = Blog.objects.select_related('fwd_blog').in_bulk(ranked)
+    entries = []
+
+    for blog_id in ranked:
+        if blog_id in blogs:
+            blogs[blog_id].trending_score = scores[blog_id]
+            entries.append(blogs[blog_id])
+
+    cache.set(_key(window), entries, settings.TRENDING_INTERVAL * 2)
+    return entries
+
+
+def top(window, limit=SIZE):
+    """Return up to ``limit`` public blogs trending in ``window``, best first, with ``fwd_blog`` preloaded."""
+    entries = cache.get(_key(window))
+
+    if entries is None:
+        entries = _rank(window, _buckets(timezone.now()), timezone.now())
+
+    return entries[:limit]
+
+
+def recompute():
+    """Refresh ``Blog.trending_score`` and every window's ranking; return the number of scored blogs."""
+    now = timezone.now()
+    buckets = _buckets(now)
+    scores = _scores(buckets, now, settings.TRENDING_WINDOWS[settings.TRENDING_WINDOW])
+
+    with transaction.atomic():
+        scored = Blog.objects.filter(trending_score__gt=0).values_list('id', flat=True)
+        stale = [pk for pk in scored if pk not in scores]
+        for start in range(0, len(stale), BATCH_SIZE):
+            Blog.objects.filter(pk__in=stale[start:start + BATCH_SIZE]).update(trending_score=0)
+
+        items = list(scores.items())
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            score = Case(*[When(pk=pk, then=Value(value)) for pk, value in batch], output_field=FloatField())
+            Blog.objects.filter(pk__in=[pk for pk, value in batch]).update(trending_score=score)
+
+        oldest = _hour(now) - timedelta(hours=max(settings.TRENDING_WINDOWS.values()))
+        TrendingBucket.objects.filter(hour__lt=oldest).delete()
+
+    for window in settings.TRENDING_WINDOWS:
+        _rank(window, buckets, now)
+
+    return len(scores)
+
+
+def forget(blog):
+    """Drop the cached rankings that show ``blog`` or a forward of it."""
+    for window in settings.TRENDING_WINDOWS:
+        entries = cache.get(_key(window))
+        if entries and any(blog.id in (entry.id, entry.fwd_blog_id) for entry in entries):
+            cache.delete(_key(window))
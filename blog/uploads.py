@@ -0,0 +1,211 @@
+"""
+Resumable chunked music uploads.
+
+A client starts an upload, appends chunks at the offset the server reports,
+and finishes it. Chunks stream straight to a ``.part`` file under
+``settings.MUSIC_UPLOAD_DIR``; the first chunk is sniffed so non-MP3 files
+are rejected before the rest is sent. Appends and finishing hold an
+exclusive lock on the part file, so concurrent requests for one upload run
+in turn, and ``prune`` removes parts abandoned for
+``settings.MUSIC_UPLOAD_EXPIRY`` seconds. Finished files are stored under
+their SHA-256, so identical audio always maps to one ``Music`` row; the
+uploader is recorded on it, and metadata extraction runs as a background
+task.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+
+from . import audio, tasks
+from .models import Music
+
+
+CHUNK_SIZE = 65536
+
+UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super(UploadError, self).__init__(message)
+        self.status = status
+
+
+def _part_path(user, upload_id):
+    if not UPLOAD_ID.match(upload_id or ''):
+        raise UploadError('Unknown upload.', 404)
+    return os.path.join(settings.MUSIC_UPLOAD_DIR, '{0}-{1}.part'.format(user.id, upload_id))
+
+
+def start(user):
+    if not os.path.isdir(settings.MUSIC_UPLOAD_DIR):
+        os.makedirs(settings.MUSIC_UPLOAD_DIR)
+
+    upload_id = uuid.uuid4().hex
+    open(_part_path(user, upload_id), 'wb').close()
+
+    return upload_id
+
+
+def offset(user, upload_id):
+    """Return how many bytes of an upload the server already has."""
+    try:
+        return os.path.getsize(_part_path(user, upload_id))
+    except OSError:
+        raise UploadError('Unknown upload.', 404)
+
+
+@contextmanager
+def _locked(user, upload_id, mode):
+    """Open an upload's part file and hold its lock until the block exits."""
+    path = _part_path(user, upload_id)
+    try:
+        part = open(path, mode)
+    except (IOError, OSError):
+        raise UploadError('Unknown upload.', 404)
+
+    with part:
+        fcntl.flock(part.fileno(), fcntl.LOCK_EX)
+        # Finished or rejected by the request we waited for.
+        if not os.path.exists(path):
+            raise UploadError('Unknown upload.', 404)
+        yield path, part
+
+
+def append(user, upload_id, start_offset, stream):
+    """Write the chunk read from ``stream`` at ``start_offset``; returns the new offset."""
+    with _locked(user, upload_id, 'r+b') as (path, part):
+        current = os.fstat(part.fileno()).st_size
+        if start_offset != current:
+            raise UploadError('Expected offset {0}.'.format(current), 409)
+
+        part.seek(current)
+        head = b''
+        while True:
+            data = stream.read(CHUNK_SIZE)
+            if not data:
+                break
+            if current == 0 and len(head) < audio.SNIFF_SIZE:
+                head += data[:audio.SNIFF_SIZE - len(head)]
+                if len(head) >= audio.SNIFF_SIZE and not audio.sniff(head):
+                    os.remove(path)
+                    raise UploadError('Not an MP3 file.', 415)
+            current += len(data)
+            if current > settings.MAX_MUSIC_SIZE:
+                os.remove(path)
+                raise UploadError('Music file too large.', 413)
+            part.write(data)
+
+    return current
+
+
+def _digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for data in iter(lambda: handle.read(CHUNK_SIZE), b''):
+            sha.update(data)
+    return sha.hexdigest()
+
+
+def _store(path, digest):
+    """Move the file at ``path`` to its content-addressed name and return its ``Music``."""
+    existing = Music.objects.filter(content_hash=digest).first()
+    if existing is not None:
+        os.remove(path)
+        return existing
+
+    name = 'static/blog/music/{0}.mp3'.format(digest)
+    target = default_storage.path(name)
+    if not os.path.isdir(os.path.dirname(target)):
+        os.makedirs(os.path.dirname(target))
+    os.replace(path, target)
+
+    try:
+        with transaction.atomic():
+            music = Music.objects.create(music=name, content_hash=digest)
+    except IntegrityError:
+        return Music.objects.get(content_hash=digest)
+
+    tasks.submit(extract_metadata, music.id, key='music-metadata:{0}'.format(music.id))
+
+    return music
+
+
+def finish(user, upload_id):
+    with _locked(user, upload_id, 'rb') as (path, part):
+        if os.fstat(part.fileno()).st_size < audio.SNIFF_SIZE:
+            raise UploadError('Upload is empty.')
+
+        if not audio.sniff(part.read(audio.SNIFF_SIZE)):
+            os.remove(path)
+            raise UploadError('Not an MP3 file.', 415)
+
+        music = _store(path, _digest(path))
+
+    music.uploaders.add(user)
+
+    return music
+
+
+def prune():
+    """Delete part files untouched for ``settings.MUSIC_UPLOAD_EXPIRY`` seconds; return how many."""
+    if not os.path.isdir(settings.MUSIC_UPLOAD_DIR):
+        return 0
+
+    cutoff = time.time() - settings.MUSIC_UPLOAD_EXPIRY
+    count = 0
+
+    for name in os.listdir(settings.MUSIC_UPLOAD_DIR):
+        path = os.path.join(settings.MUSIC_UPLOAD_DIR, name)
+        if not name.endswith('.part'):
+            continue
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            with open(path, 'rb') as part:
+                # Skip parts a request is writing to right now.
+                fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.remove(path)
+        except (IOError, OSError):
+            continue
+        count += 1
+
+    return count
+
+
+def store_file(user, uploaded):
+    """Store a music file posted through a regular form the same way as a chunked upload."""
+    upload_id = start(user)
+    for chunk in uploaded.chunks():
+        append(user, upload_id, offset(user, upload_id), _Chunk(chunk))
+
+    return finish(user, upload_id)
+
+
+class _Chunk(object):
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size):
+        data, self.data = self.data[:size], self.data[size:]
+        return data
+
+
+def extract_metadata(music_id):
+    music = Music.objects.get(pk=music_id)
+    metadata = audio.read_metadata(default_storage.path(music.music.name))
+
+    Music.objects.filter(pk=music_id).update(
+        singer=(metadata['singer'] or '')[:50] or None,
+        song_name=(metadata['song_name'] or '')[:100] or None,
+        bitrate=metadata['bitrate'],
+        duration=metadata['duration'],
+    )
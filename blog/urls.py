@@ -4,7 +4,7 @@ from django.conf.urls.static import static
 from . import views
 from django.contrib.auth import views as auth_views
 from .views import IndexView, UserControlView, WriteBlogView, UserView, BlogView, DeleteCommentView, NewsView, \
-    DetailNewsView
+    DetailNewsView, MusicUploadView, AvatarView, ProfilePhotoView, MusicView, LikesView
 
 app_name = 'blog'
 urlpatterns = [
@@ -23,6 +23,18 @@ urlpatterns = [
 
     url(r'^blog/write', WriteBlogView.as_view(), name='writeblog'),
 
+    url(r'^music/upload$', MusicUploadView.as_view(), name='musicupload'),
+
+    url(r'^music/upload/(?P<upload_id>[0-9a-f]{32})/(?P<slug>\w+)$', MusicUploadView.as_view(), name='musicupload'),
+
+    url(r'^avatar/(?P<name>[0-9a-f]{64}-[0-9]+\.(?:jpg|webp))$', AvatarView.as_view(), name='avatar'),
+
+    url(r'^photo/(?P<u_id>[0-9]+)$', ProfilePhotoView.as_view(), name='photo'),
+
+    url(r'^music/(?P<m_id>[0-9]+)$', MusicView.as_view(), name='music'),
+
+    url(r'^likes$', LikesView.as_view(), name='likes'),
+
     url(r'^blog/(?P<b_id>[0-9]+)/(?P<slug>\w+)$', BlogView.as_view(), name='blog'),
 
     url(r'^comment/(?P<c_id>[0-9]+)/delete', DeleteCommentView.as_view(), name='comment'),
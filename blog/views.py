@@ -1,18 +1,22 @@
 from django.contrib.auth.decorators import login_required
-from django.db.models import F
 from django.shortcuts import render, get_object_or_404, Http404
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
-from django.views.generic import View, ListView
+from django.views.generic import View
 from django.views.generic.edit import ContextMixin
 from django.core.exceptions import PermissionDenied
+from django.db import transaction
 
 from .models import Blog, Comment, User, Music, Relationship, LikeRelationship
 from .forms import BlogForm, LoginForm, RegisterForm, ImageUploadForm, MusicUploadForm, CommentForm, ForwardForm
+from . import (avatars, concurrent, effects, graph, leaderboard, likes, loaders, media, notifications, pagecontext,
+               search, tasks, timeline, uploads)
+from .counters import blog_counters, view_counts
+from .pagination import InvalidCursor, paginate
 
 
 # Create your views here.
@@ -21,44 +25,59 @@ def get_music_information(music):
     return information
 
 
+def fetched(page):
+    """Run a page's query now, so it happens on the thread that gathered it."""
+    page.object_list
+    return page
+
+
 class BaseMixin(ContextMixin):
-    def get_context_data(self, **kwargs):
-        context = super(BaseMixin, self).get_context_data(**kwargs)
+    # Handlers that write and redirect shouldn't call get_context_data; it loads what pages render.
 
-        if self.request.user.is_active:
-            log_user = User.objects.get(pk=self.request.user.id)
-            context['log_user'] = log_user
-            context['following_count'] = Relationship.objects.filter(from_user=log_user).count()
-            context['follower_count'] = Relationship.objects.filter(to_user=log_user).count()
-        else:
-            context['log_user'] = None
+    def context_queries(self):
+        """Return ``{context name: function}`` for the page's independent reads.
 
-        context['popularity'] = Blog.objects.filter(blog_private=False).order_by('-popularity', '-id')[0:5]
+        They are gathered concurrently (see ``blog.concurrent``), so they may
+        only use the request, not each other's results.
+        """
+        return {}
+
+    def get_context_data(self, **kwargs):
+        context = super(BaseMixin, self).get_context_data(**kwargs)
+        context.update(pagecontext.for_request(self.request).as_dict())
+        context.update(concurrent.gather(self.context_queries()))
 
         return context
 
 
 # URL name = 'index'
-class IndexView(BaseMixin, ListView):
+class IndexView(BaseMixin, TemplateView):
     template_name = 'blog/index.html'
-    paginate_by = 10
 
-    def get_context_data(self, **kwargs):
-        context = super(IndexView, self).get_context_data(**kwargs)
-        blog = Blog.objects.none()
+    def context_queries(self):
+        queries = super(IndexView, self).context_queries()
+        user_id = self.request.user.id
 
         if self.request.user.is_active:
-            user = context['log_user']
-            context['follow_list'] = user.follow.all()
+            queries['follow_version'] = lambda: graph.follow_version(user_id)
+            queries['blog_list'] = lambda: fetched(timeline.read(user_id, self.request.GET.get('cursor')))
+            queries['suggestions'] = lambda: graph.suggestions(user_id)
 
-            for user in user.follow.all():
-                blog = blog | Blog.objects.filter(blog_author=user, blog_private=False)
+        return queries
 
-        context['blog_list'] = blog
-        return context
+    def get_context_data(self, **kwargs):
+        try:
+            context = super(IndexView, self).get_context_data(**kwargs)
+        except InvalidCursor:
+            raise Http404
 
-    def get_queryset(self):
-        return User.objects.all()
+        if context['log_user'] is not None:
+            # Only read when the cached fragment showing it has expired.
+            context['follow_list'] = context['log_user'].follow.all()
+        else:
+            context['blog_list'] = []
+
+        return context
 
 
 # URL name = 'usercontrol'
@@ -74,6 +93,8 @@ class UserControlView(BaseMixin, View):
             return self.following_detail(self.request)
         elif slug == 'follower':
             return self.follower_detail(self.request)
+        elif slug == 'search':
+            return self.search()
         raise PermissionDenied
 
     def post(self, *args, **kwargs):
@@ -148,18 +169,15 @@ class UserControlView(BaseMixin, View):
     @method_decorator(login_required)
     def manage(self, request):
         form = ImageUploadForm(self.request.POST, self.request.FILES)
-        context = self.get_context_data()
 
         if form.is_valid():
             if form.clean_file():
-                log_user = context['log_user']
-                log_user.profile_photo = form.cleaned_data['profile']
-                log_user.save()
+                avatars.store(self.request.user, form.cleaned_data['profile'])
             else:
-                context['error_message'] = 'Image too large'
+                context = self.get_context_data(error_message='Image too large')
                 return render(self.request, 'blog/upload_profile.html', context)
         else:
-            context['error_message'] = 'Submit file is nor an image.'
+            context = self.get_context_data(error_message='Submit file is nor an image.')
             return render(self.request, 'blog/upload_profile.html', context)
 
         return HttpResponseRedirect(reverse('blog:index'))
@@ -169,7 +187,8 @@ class UserControlView(BaseMixin, View):
         context = self.get_context_data()
         log_user = context['log_user']
         context['type'] = 'Following'
-        context['relationships'] = log_user.follow.all()
+        relationships = Relationship.objects.select_related('to_user').filter(from_user=log_user)
+        context['relationships'] = paginate(self.request, relationships, 'add_date')
 
         return render(self.request, 'blog/relationship.html', context)
 
@@ -178,18 +197,27 @@ class UserControlView(BaseMixin, View):
         context = self.get_context_data()
         log_user = context['log_user']
         context['type'] = 'Follower'
-        context['relationships'] = Relationship.objects.select_related('from_user').filter(to_user=log_user)
+        relationships = Relationship.objects.select_related('from_user').filter(to_user=log_user)
+        context['relationships'] = paginate(self.request, relationships, 'add_date')
+        followers = [relationship.from_user_id for relationship in context['relationships']]
+        context['following_ids'] = graph.following_among(log_user.id, followers)
 
         return render(self.request, 'blog/relationship.html', context)
 
     def search(self):
         context = self.get_context_data()
-        keyword = self.request.POST['keyword']
-        blog = Blog.objects.filter(blog_title__contains=keyword, blog_private=False)
-        user = User.objects.filter(username__contains=keyword)
+        keyword = self.request.POST.get('keyword', self.request.GET.get('keyword', '')).strip()
+
+        try:
+            page = int(self.request.GET.get('page', 1))
+        except ValueError:
+            raise Http404
+        if page < 1:
+            raise Http404
 
-        context['result_blog'] = blog
-        context['result_user'] = user
+        context['keyword'] = keyword
+        context['result_blog'] = search.search_blogs(keyword, page)
+        context['result_user'] = search.search_users(keyword) if page == 1 else []
 
         return render(self.request, 'blog/searchresult.html', context)
 
@@ -201,10 +229,10 @@ class NewsView(BaseMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super(NewsView, self).get_context_data()
         log_user = context['log_user']
-        context['like_news_count'] = LikeRelationship.objects.filter(to_author=log_user.id, viewed=False).count()
-        context['comment_news_count'] = Comment.objects.filter(comment_blog__blog_author=log_user, viewed=False).count()
-        context['forward_news_count'] = Blog.objects.filter(fwd_blog__blog_author=log_user, fwd_viewed=False).count()
-        context['follow_news_count'] = Relationship.objects.filter(to_user=log_user,  reviewed=False).count()
+        context['like_news_count'] = log_user.like_news
+        context['comment_news_count'] = log_user.comment_news
+        context['forward_news_count'] = log_user.forward_news
+        context['follow_news_count'] = log_user.follow_news
 
         return context
 
@@ -223,36 +251,31 @@ class DetailNewsView(BaseMixin, TemplateView):
         context = super(DetailNewsView, self).get_context_data()
         slug = self.kwargs.get('slug')
         log_user = context['log_user']
+        loader = loaders.for_request(self.request)
 
         if slug == 'likes':
             context['name'] = 'likes'
             news = LikeRelationship.objects.filter(to_author=log_user.id, viewed=False)
-            context['news'] = list(news)
-            news.update(viewed=True)
-            log_user.like_news = F('like_news') - len(context['news'])
+            context['news'] = loader.attach(news, 'from_user', 'to_blog')
+            notifications.add(log_user.id, 'like_news', -news.update(viewed=True))
         elif slug == 'comments':
             context['name'] = 'comments'
             news = Comment.objects.filter(comment_blog__blog_author_id=log_user.id, viewed=False)
-            context['news'] = list(news)
-            news.update(viewed=True)
-            log_user.comment_news = F('comment_news') - len(context['news'])
+            context['news'] = loader.attach(news, 'comment_author', 'comment_blog')
+            notifications.add(log_user.id, 'comment_news', -news.update(viewed=True))
         elif slug == 'forwards':
             context['name'] = 'forward'
             news = Blog.objects.filter(fwd_blog__blog_author=log_user, fwd_viewed=False)
-            context['news'] = list(news)
-            news.update(fwd_viewed=True)
-            log_user.forward_news = F('forward_news') - len(context['news'])
+            context['news'] = loader.attach(news, 'blog_author', 'fwd_blog')
+            notifications.add(log_user.id, 'forward_news', -news.update(fwd_viewed=True))
         elif slug == 'follows':
             context['name'] = 'follows'
             news = Relationship.objects.filter(to_user=log_user, reviewed=False)
-            context['news'] = list(news)
-            news.update(reviewed=True)
-            log_user.follow_news = F('follow_news') - len(context['news'])
+            context['news'] = loader.attach(news, 'from_user')
+            notifications.add(log_user.id, 'follow_news', -news.update(reviewed=True))
         else:
             raise Http404
 
-        log_user.save()
-
         return context
 
     @method_decorator(login_required)
@@ -284,34 +307,32 @@ class UserView(BaseMixin, View):
         else:
             raise PermissionDenied
 
-    def get_context_data(self, **kwargs):
-        context = super(UserView, self).get_context_data(**kwargs)
-        log_user = context['log_user']
+    def is_self(self):
+        return self.request.user.is_active and self.kwargs.get('u_id') == str(self.request.user.id)
+
+    def context_queries(self):
+        queries = super(UserView, self).context_queries()
         home_id = self.kwargs.get('u_id')
-        user = get_object_or_404(User, pk=home_id)
-        blog_list = Blog.objects.filter(blog_author=user)
+        blog_list = Blog.objects.filter(blog_author_id=home_id)
+        if not self.is_self():
+            blog_list = blog_list.filter(blog_private=False)
 
-        if type(log_user) is User:
-            context['follow'] = user in log_user.follow.all()
+        queries['User'] = lambda: get_object_or_404(User, pk=home_id)
+        queries['Blog_list'] = lambda: fetched(paginate(self.request, blog_list, 'blog_postdate'))
+        queries['mutuals'] = lambda: list(graph.mutuals(home_id)[:graph.MUTUALS_SHOWN])
 
-            if home_id == str(log_user.id):
-                is_self = True
-            else:
-                is_self = False
-                blog_list = blog_list.filter(blog_private=False)
-                try:
-                    context['follow'] = user in log_user.follow.all()
-                except AttributeError:
-                    context['follow'] = False
+        if self.request.user.is_active and not self.is_self():
+            log_user_id = self.request.user.id
+            queries['follow'] = lambda: graph.is_following(log_user_id, home_id)
+            queries['followed_by'] = lambda: graph.is_following(home_id, log_user_id)
 
-        else:
-            is_self = False
-            context['follow'] = False
-            blog_list = blog_list.filter(blog_private=False)
+        return queries
 
-        context['User'] = user
-        context['Blog_list'] = blog_list
-        context['self'] = is_self
+    def get_context_data(self, **kwargs):
+        context = super(UserView, self).get_context_data(**kwargs)
+        context.setdefault('follow', False)
+        loaders.for_request(self.request).attach(context['Blog_list'], 'fwd_blog.blog_author')
+        context['self'] = self.is_self()
 
         return context
 
@@ -322,23 +343,12 @@ class UserView(BaseMixin, View):
 
     @method_decorator(login_required)
     def follow(self, request):
-        context = self.get_context_data()
-        added_user = context['User']
-        log_user = context['log_user']
+        added_user = get_object_or_404(User, pk=self.kwargs.get('u_id'))
 
-        if not context['follow']:
-            relationship = Relationship.objects.create(
-                from_user=log_user,
-                to_user=added_user,
-                add_date=timezone.now()
-            )
-            relationship.save()
-            added_user.save()
-            context['follow'] = True
+        if not graph.is_following(request.user.id, added_user.id):
+            graph.follow(request.user, added_user)
         else:
-            Relationship.objects.filter(from_user=log_user, to_user=added_user).delete()
-            added_user.save()
-            context['follow'] = False
+            graph.unfollow(request.user, added_user)
 
         try:
             next_page = self.request.POST['next_page']
@@ -374,7 +384,6 @@ class WriteBlogView(BaseMixin, View):
     @method_decorator(login_required)
     def post(self, request, *args, **kwargs):
         form = BlogForm(self.request.POST, self.request.FILES)
-        context = self.get_context_data()
 
         if form.is_valid():
             if form.clean_file():
@@ -382,27 +391,118 @@ class WriteBlogView(BaseMixin, View):
                 content = form.cleaned_data['content']
                 private = form.cleaned_data['private']
                 music = form.cleaned_data['music']
-                m = Music.objects.create()
-                m.music = music
-                m.save()
+                music_id = form.cleaned_data['music_id']
+                m = None
+                if music_id:
+                    m = get_object_or_404(Music, pk=music_id)
+                    if not media.may_attach(self.request.user, m):
+                        raise PermissionDenied
+                elif music:
+                    try:
+                        m = uploads.store_file(self.request.user, music)
+                    except uploads.UploadError:
+                        return HttpResponseRedirect(reverse('blog:writeblog'))
                 post_date = timezone.now()
                 author = self.request.user.id
                 blog = Blog.objects.create(blog_title=title, blog_content=content, blog_postdate=post_date,
-                                           blog_author_id=author, blog_private=private)
-                blog.relate_music = m
-                try:
-                    blog.save()
-                except Exception:
-                    return render(reverse('blog:writeblog'))
-                else:
-                    return HttpResponseRedirect(reverse('blog:blog', kwargs={'b_id': blog.id, 'slug': 'view'}))
+                                           blog_author_id=author, blog_private=private, relate_music=m)
+                tasks.submit(effects.posted, blog.id, key='posted:{0}'.format(blog.id))
+                return HttpResponseRedirect(reverse('blog:blog', kwargs={'b_id': blog.id, 'slug': 'view'}))
             else:
-                context['error_message'] = 'Music file too large.'
                 return HttpResponseRedirect(reverse('blog:writeblog'))
         else:
             return HttpResponseRedirect(reverse('blog:writeblog'))
 
 
+# URL name = musicupload
+class MusicUploadView(View):
+    @method_decorator(login_required)
+    def get(self, *args, **kwargs):
+        try:
+            offset = uploads.offset(self.request.user, self.kwargs.get('upload_id'))
+        except uploads.UploadError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+        return JsonResponse({'upload_id': self.kwargs.get('upload_id'), 'offset': offset})
+
+    @method_decorator(login_required)
+    def post(self, request, *args, **kwargs):
+        upload_id = self.kwargs.get('upload_id')
+        slug = self.kwargs.get('slug')
+
+        try:
+            if upload_id is None:
+                return JsonResponse({'upload_id': uploads.start(request.user), 'offset': 0})
+            elif slug == 'chunk':
+                try:
+                    start = int(request.GET.get('offset', ''))
+                except ValueError:
+                    return JsonResponse({'error': 'Missing offset.'}, status=400)
+                offset = uploads.append(request.user, upload_id, start, request)
+                return JsonResponse({'upload_id': upload_id, 'offset': offset})
+            elif slug == 'finish':
+                music = uploads.finish(request.user, upload_id)
+                return JsonResponse({'music_id': music.id})
+        except uploads.UploadError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+        raise Http404
+
+
+# URL name = avatar
+class AvatarView(View):
+    def get(self, *args, **kwargs):
+        name = self.kwargs.get('name')
+
+        return media.serve(self.request, '{0}/{1}'.format(avatars.AVATAR_DIR, name), etag=name,
+                           cache_control='public, max-age=31536000, immutable')
+
+
+# URL name = photo
+class ProfilePhotoView(View):
+    def get(self, *args, **kwargs):
+        user = get_object_or_404(User.objects.only('profile_photo'), pk=self.kwargs.get('u_id'))
+
+        if not user.profile_photo:
+            raise Http404
+
+        return media.serve(self.request, user.profile_photo.name, cache_control='public, max-age=3600')
+
+
+# URL name = music
+class MusicView(View):
+    def get(self, *args, **kwargs):
+        music = get_object_or_404(Music, pk=self.kwargs.get('m_id'))
+        access = media.music_access(self.request.user, music)
+
+        if access is None or not music.music:
+            raise Http404
+
+        return media.serve(self.request, music.music.name, etag=music.content_hash,
+                           cache_control='{0}, max-age=86400'.format(access))
+
+
+# URL name = likes
+class LikesView(View):
+    @method_decorator(login_required)
+    def post(self, request, *args, **kwargs):
+        try:
+            like_ids = [int(pk) for pk in request.POST.getlist('like')]
+            unlike_ids = [int(pk) for pk in request.POST.getlist('unlike')]
+        except ValueError:
+            return JsonResponse({'error': 'Blog ids must be integers.'}, status=400)
+
+        if len(like_ids) + len(unlike_ids) > likes.BATCH_SIZE:
+            return JsonResponse({'error': 'At most {0} blogs per request.'.format(likes.BATCH_SIZE)}, status=400)
+
+        blogs = Blog.objects.only(*likes.FIELDS).in_bulk(like_ids + unlike_ids)
+        liked, unliked = likes.apply(request.user,
+                                     [blogs[pk] for pk in like_ids if pk in blogs],
+                                     [blogs[pk] for pk in unlike_ids if pk in blogs])
+
+        return JsonResponse({'liked': [blog.id for blog in liked], 'unliked': [blog.id for blog in unliked]})
+
+
 # URL name = 'blog'
 class BlogView(BaseMixin, View):
     def get(self, *args, **kwargs):
@@ -418,7 +518,7 @@ class BlogView(BaseMixin, View):
         slug = self.kwargs.get('slug')
 
         if slug == 'delete':
-            return self.deleteblog()
+            return self.deleteblog(self.request)
         elif slug == 'like':
             return self.like(self.request)
         elif slug == 'forward':
@@ -426,54 +526,53 @@ class BlogView(BaseMixin, View):
         elif slug == 'comment':
             return self.comment(self.request)
 
-    def get_context_data(self, *args, **kwargs):
-        context = super(BlogView, self).get_context_data(**kwargs)
-        log_user = context['log_user']
+    def context_queries(self):
+        queries = super(BlogView, self).context_queries()
         b_id = self.kwargs.get('b_id')
-        blog = Blog.objects.get(pk=b_id)
-        home_id = blog.blog_author_id
-        user = get_object_or_404(User, pk=home_id)
+        # Everything viewblog.html renders for the blog itself comes from this one query.
+        blogs = Blog.objects.select_related('blog_author', 'fwd_blog__blog_author', 'relate_music')
+        comments = Comment.objects.filter(comment_blog_id=b_id).select_related('comment_author')
 
-        if type(log_user) is User:
+        queries['blog'] = lambda: get_object_or_404(blogs, pk=b_id)
+        queries['comment_list'] = lambda: fetched(paginate(self.request, comments, 'comment_date'))
 
-            if home_id == log_user.id:
-                is_self = True
-            else:
-                is_self = False
+        if self.request.user.is_active:
+            log_user_id = self.request.user.id
+            queries['liked'] = lambda: LikeRelationship.objects.filter(to_blog_id=b_id,
+                                                                       from_user_id=log_user_id).exists()
 
-            context['liked'] = blog.liked_user.filter(pk=log_user.id).exists()
-        else:
-            is_self = False
-            context['liked'] = False
+        return queries
 
-        context['blog'] = blog
+    def get_context_data(self, *args, **kwargs):
+        context = super(BlogView, self).get_context_data(**kwargs)
+        log_user = context['log_user']
+        blog = context['blog']
+        user = blog.blog_author
+
+        context.setdefault('liked', False)
         context['User'] = user
-        context['self'] = is_self
-        context['comment_list'] = blog.comment_set.all()
+        context['self'] = log_user is not None and blog.blog_author_id == log_user.id
         if user == log_user:
-            context['comment_list'].update(viewed=True)
+            viewed = blog.comment_set.filter(viewed=False).update(viewed=True)
+            notifications.add(user.id, 'comment_news', -viewed)
 
-        if blog.relate_music is not None:
-            context['music'] = blog.relate_music.music
+        if blog.relate_music is not None and blog.relate_music.music:
+            context['music'] = blog.relate_music
 
         return context
 
     def view(self):
         context = self.get_context_data()
         blog = context['blog']
-        blog.view_count = F('view_count') + 1
-        blog.save()
-        blog.refresh_from_db()
-        context['blog'] = blog
+        view_counts.incr(blog.id)
+        blog.view_count += view_counts.pending(blog.id)
+        blog_counters.apply([blog])
 
         return render(self.request, 'blog/viewblog.html', context)
 
     @method_decorator(login_required)
     def forward(self, request):
-        context = self.get_context_data()
-        blog = context['blog']
-        log_user = context['log_user']
-
+        blog = get_object_or_404(Blog, pk=self.kwargs.get('b_id'))
         form = ForwardForm(self.request.POST)
 
         if form.is_valid():
@@ -481,68 +580,43 @@ class BlogView(BaseMixin, View):
             fwdprivate = form.cleaned_data['fwdprivate']
             fwddate = timezone.now()
             fwdblog = Blog(
-                blog_author=log_user,
+                blog_author=request.user,
                 blog_title=fwdcontent,
                 blog_postdate=fwddate,
-                blog_private=fwdprivate,
+                blog_private=fwdprivate == '1',
                 fwd_blog=blog,
-                relate_music=blog.relate_music
+                relate_music_id=blog.relate_music_id
             )
             if not fwdprivate:
                 fwdblog.fwd_viewed = True
 
             fwdblog.save()
-            blog.popularity = F('popularity') + 1
-            blog.forward_count = F('forward_count') + 1
-            blog.blog_author.save()
-            blog.save()
+            tasks.submit(effects.forwarded, fwdblog.id, key='forwarded:{0}'.format(fwdblog.id))
 
         return HttpResponseRedirect(reverse('blog:blog', kwargs={'b_id': blog.id, 'slug': 'view'}))
 
     @method_decorator(login_required)
     def like(self, request):
-        context = self.get_context_data()
-        blog = context['blog']
-        log_user = context['log_user']
-        log_user_id = log_user.id
-
-        if log_user_id != blog.blog_author_id:
-            if blog.liked_user.filter(pk=log_user_id).exists():
-                LikeRelationship.objects.get(to_blog=blog, from_user=log_user).delete()
-                blog.popularity = F('popularity') - 1
-                blog.like_count = F('like_count') - 1
-                blog.save()
-                blog.blog_author.save()
-            else:
-                LikeRelationship.objects.create(to_blog=blog,
-                                                from_user=log_user,
-                                                to_author=blog.blog_author.id).save()
-                blog.popularity = F('popularity') + 1
-                blog.like_count = F('like_count') + 1
-                blog.save()
-                blog.blog_author.save()
+        blog = get_object_or_404(Blog.objects.only(*likes.FIELDS), pk=self.kwargs.get('b_id'))
+        likes.toggle(request.user, blog)
 
         return HttpResponseRedirect(reverse('blog:blog', kwargs={'b_id': blog.id, 'slug': 'view'}))
 
-    def deleteblog(self):
-        context = self.get_context_data()
-        blog = context['blog']
-        log_user = context['log_user']
-        if blog.blog_author_id == log_user.id:
-            Blog.objects.get(pk=blog.id).delete()
-            context['blog'] = None
-            context['follow'] = False
-            context['Blog_list'] = Blog.objects.filter(blog_author=log_user)
-
-        context['comment_list'] = None
-        context['music'] = None
+    @method_decorator(login_required)
+    def deleteblog(self, request):
+        blog = get_object_or_404(Blog, pk=self.kwargs.get('b_id'))
+        if blog.blog_author_id == request.user.id:
+            with transaction.atomic():
+                notifications.forget_blog(blog.id)
+                # Timeline entries of the blog and its forwards go with it through the cascade.
+                Blog.objects.filter(pk=blog.id).delete()
+            leaderboard.remove(blog)
 
-        return HttpResponseRedirect(reverse('blog:user', kwargs={'u_id': log_user.id, 'slug': 'homepage'}))
+        return HttpResponseRedirect(reverse('blog:user', kwargs={'u_id': request.user.id, 'slug': 'homepage'}))
 
     @method_decorator(login_required)
     def comment(self, request):
-        context = self.get_context_data()
-        blog = context['blog']
+        blog = get_object_or_404(Blog, pk=self.kwargs.get('b_id'))
         form = CommentForm(self.request.POST)
 
         if form.is_valid():
@@ -553,52 +627,24 @@ class BlogView(BaseMixin, View):
                               comment_date=date)
             try:
                 comment.save()
-                blog.popularity = F('popularity') + 1
-                blog.comment_count = F('comment_count') + 1
-                blog.blog_author.save()
-                blog.save()
+                tasks.submit(effects.commented, blog.id, key='commented:{0}'.format(comment.id))
             except Exception:
                 raise Http404
-            else:
-                context['comment_list'] = blog.comment_set.all()
 
         return HttpResponseRedirect(reverse('blog:blog', kwargs={'b_id': blog.id, 'slug': 'view'}))
 
 
 # URL name = 'comment'
-class DeleteCommentView(BaseMixin, View):
+class DeleteCommentView(View):
     @method_decorator(login_required)
     def post(self, request, *args, **kwargs):
-        context = self.get_context_data()
-        c_id = self.kwargs.get('c_id')
-        blog = context['blog']
+        comment = get_object_or_404(Comment.objects.select_related('comment_blog'), pk=self.kwargs.get('c_id'))
+        blog = comment.comment_blog
 
-        if context['self']:
-            Comment.objects.get(pk=c_id).delete()
-            context['comment_list'] = blog.comment_set.all()
-            blog.comment_count = F('comment_count') - 1
+        if blog.blog_author_id == request.user.id:
+            comment.delete()
+            if not comment.viewed:
+                notifications.add(blog.blog_author_id, 'comment_news', -1)
+            blog_counters.add([blog.id], comment_count=-1)
 
         return HttpResponseRedirect(reverse('blog:blog', kwargs={'b_id': blog.id, 'slug': 'view'}))
-
-    def get_context_data(self, *args, **kwargs):
-        context = super(DeleteCommentView, self).get_context_data(**kwargs)
-        log_user = context['log_user']
-        c_id = self.kwargs.get('c_id')
-        comment = Comment.objects.get(pk=c_id)
-        b_id = comment.comment_blog.id
-        blog = Blog.objects.get(pk=b_id)
-        home_id = blog.blog_author_id
-        user = get_object_or_404(User, pk=home_id)
-
-        if home_id == log_user.id:
-            is_self = True
-        else:
-            is_self = False
-
-        context['liked'] = blog.liked_user.filter(pk=log_user.id).exists()
-        context['blog'] = blog
-        context['User'] = user
-        context['self'] = is_self
-        context['comment_list'] = blog.comment_set.all()
-
-        return context
@@ -0,0 +1,121 @@
+"""
+ASGI config for newp project.
+
+Django 1.10 only speaks WSGI, so ``application`` adapts the WSGI handler to
+ASGI 3: the event loop accepts connections and reads request bodies, and
+each request is handled on one of ``settings.ASGI_THREADS`` worker threads,
+with the response streamed back a chunk at a time. Run it with any ASGI
+server, e.g. ``uvicorn newp.asgi:application``.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "newp.settings")
+
+wsgi_application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402  (after the settings module is chosen)
+
+executor = ThreadPoolExecutor(max_workers=settings.ASGI_THREADS)
+
+_DONE = object()
+
+
+def _latin1(value):
+    return value.encode('utf-8').decode('latin-1')
+
+
+def _environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': _latin1(scope.get('root_path', '')),
+        'PATH_INFO': _latin1(scope['path']),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{0}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        value = value.decode('latin-1')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+
+    return environ
+
+
+def _handle(environ):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]),
+                      [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+
+    result = wsgi_application(environ, start_response)
+    return started[0], started[1], result
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        raise ValueError('Unsupported ASGI scope type {0!r}'.format(scope['type']))
+
+    # Bodies past Django's in-memory upload limit (music chunks, photos) spill to disk.
+    body = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    body.seek(0)
+
+    loop = asyncio.get_event_loop()
+    status, headers, result = await loop.run_in_executor(executor, _handle, _environ(scope, body))
+
+    try:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        chunks = iter(result)
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, _DONE)
+            if chunk is _DONE:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(executor, result.close)
+        body.close()
@@ -0,0 +1,230 @@
+"""
+Per-request SQL and timing instrumentation.
+
+``QueryCountMiddleware`` records the number of SQL queries, total SQL time,
+template render time and wall time of every request, keyed by URL name
+(``blog:index``, ``blog:blog``, ...). Queries a view runs on
+``blog.concurrent`` pool threads are added to its request through the
+request's ``QueryRecorder``. The aggregated histograms are served as JSON
+to staff users by ``stats_view``.
+
+Views listed in ``settings.QUERY_BUDGETS`` log a warning when they run more
+queries than their budget; with ``settings.QUERY_BUDGET_STRICT`` enabled
+(as under ``manage.py test``) they raise ``QueryBudgetExceeded`` instead.
+Background tasks run inline (``settings.TASKS_ALWAYS_EAGER``) don't count
+towards the budget, since they normally run off the request path.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, JsonResponse
+from django.template.base import Template
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, used for both counts and milliseconds.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def as_dict(self):
+        labels = ['<={0}'.format(bound) for bound in BUCKETS] + ['>{0}'.format(BUCKETS[-1])]
+        return {
+            'buckets': dict((label, count) for label, count in zip(labels, self.counts) if count),
+            'total': round(self.total, 3),
+            'max': round(self.maximum, 3),
+        }
+
+
+class Stats(object):
+    METRICS = ('queries', 'sql_ms', 'template_ms', 'wall_ms')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, name, **values):
+        with self._lock:
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = {'requests': 0}
+                for metric in self.METRICS:
+                    view[metric] = Histogram()
+
+            view['requests'] += 1
+            for metric in self.METRICS:
+                view[metric].add(values[metric])
+
+    def as_dict(self):
+        with self._lock:
+            return dict(
+                (name, dict((key, value if key == 'requests' else value.as_dict()) for key, value in view.items()))
+                for name, view in self._views.items()
+            )
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+
+stats = Stats()
+
+
+class QueryRecorder(object):
+    """Counts the SQL queries of one request, whichever threads run them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.sql = 0.0
+        self.unbudgeted = 0
+
+    @contextmanager
+    def record(self):
+        """Count the queries the current thread runs inside the block."""
+        previous = getattr(_local, 'recorder', None)
+        _local.recorder = self
+        saved = []
+        for connection in connections.all():
+            saved.append((connection, connection.force_debug_cursor))
+            connection.force_debug_cursor = True
+        offsets = _offsets()
+
+        try:
+            yield
+        finally:
+            _local.recorder = previous
+            queries, sql = _executed_since(offsets)
+            for connection, force_debug_cursor in saved:
+                connection.force_debug_cursor = force_debug_cursor
+
+            with self._lock:
+                self.queries += queries
+                self.sql += sql
+
+
+def _offsets():
+    return [(connection, len(connection.queries_log)) for connection in connections.all()]
+
+
+def _executed_since(offsets):
+    """Return the number and total seconds of the queries logged after ``offsets``."""
+    queries = 0
+    sql = 0.0
+    for connection, offset in offsets:
+        executed = list(connection.queries_log)[offset:]
+        queries += len(executed)
+        sql += sum(float(query['time']) for query in executed)
+
+    return queries, sql
+
+
+def current_recorder():
+    """Return the ``QueryRecorder`` counting the current thread's queries, if any."""
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def unbudgeted():
+    """Keep the queries run inside the block out of the request's query budget.
+
+    For work that normally runs off the request path, such as background
+    tasks run inline; the queries still show in the request's stats.
+    """
+    recorder = current_recorder()
+    if recorder is None:
+        yield
+        return
+
+    offsets = _offsets()
+    try:
+        yield
+    finally:
+        queries = _executed_since(offsets)[0]
+        with recorder._lock:
+            recorder.unbudgeted += queries
+
+
+def _instrument_templates():
+    """Wrap ``Template.render`` to add top-level render time to the current request."""
+    original = Template.render
+
+    if getattr(original, 'instrumented', False):
+        return
+
+    def render(self, context):
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        start = time.time()
+        try:
+            return original(self, context)
+        finally:
+            _local.depth = depth
+            if depth == 0:
+                _local.template_time = getattr(_local, 'template_time', 0.0) + time.time() - start
+
+    render.instrumented = True
+    Template.render = render
+
+
+class QueryCountMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _instrument_templates()
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        _local.template_time = 0.0
+        start = time.time()
+        with recorder.record():
+            response = self.get_response(request)
+        wall = time.time() - start
+        queries = recorder.queries
+        sql = recorder.sql
+
+        match = request.resolver_match
+        name = match.view_name if match is not None else 'unresolved'
+
+        stats.record(name, queries=queries, sql_ms=sql * 1000, template_ms=_local.template_time * 1000,
+                     wall_ms=wall * 1000)
+        logger.info('%s %s queries=%d sql=%.1fms template=%.1fms wall=%.1fms', request.method, name, queries,
+                    sql * 1000, _local.template_time * 1000, wall * 1000)
+
+        budget = settings.QUERY_BUDGETS.get('{0} {1}'.format(request.method, name), settings.QUERY_BUDGETS.get(name))
+        budgeted = queries - recorder.unbudgeted
+        if budget is not None and budgeted > budget:
+            message = '{0} ran {1} queries, over its budget of {2}'.format(name, budgeted, budget)
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
+
+
+def stats_view(request):
+    if not request.user.is_staff:
+        raise Http404
+
+    return JsonResponse(stats.as_dict())
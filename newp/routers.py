@@ -0,0 +1,77 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go to a random alias from
+``settings.DATABASE_REPLICAS`` only while a request to one of the
+read-only views in ``settings.REPLICA_VIEWS`` is being handled; everything
+else, and any read inside a transaction on the primary, stays on
+``default``.
+
+After a client sends a write (any non-GET/HEAD request) ``ReplicaMiddleware``
+sets a short-lived cookie that pins its reads to the primary, so a user sees
+their own like, comment or post on the page they are redirected to even if
+the replicas lag behind.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+
+PIN_COOKIE = 'pin_primary'
+
+_state = threading.local()
+
+
+def reading_replicas():
+    """Return whether reads on this thread may go to a replica."""
+    return getattr(_state, 'replicas', False)
+
+
+def read_replicas(enabled):
+    """Let reads on this thread go to a replica, for work done on behalf of a request."""
+    _state.replicas = enabled
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        if not reading_replicas() or not settings.DATABASE_REPLICAS:
+            return 'default'
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.replicas = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replicas = False
+
+        if request.method not in ('GET', 'HEAD') and settings.DATABASE_REPLICAS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _state.replicas = (
+            request.method in ('GET', 'HEAD') and
+            request.resolver_match.view_name in settings.REPLICA_VIEWS and
+            PIN_COOKIE not in request.COOKIES
+        )
@@ -0,0 +1,22 @@
+"""
+SQLite connection tuning.
+
+Every new SQLite connection runs the ``PRAGMA`` statements in
+``settings.SQLITE_PRAGMAS``. The production profile (see settings) turns on
+WAL so readers don't block the writer, relaxes ``synchronous`` to ``NORMAL``
+(safe under WAL), maps the file into memory and waits on a locked database
+instead of failing with "database is locked".
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute('PRAGMA {0} = {1}'.format(name, value))